@@ -0,0 +1,282 @@
+# approximate.py
+
+import logging
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import cube
+import data_processing
+import sampling
+
+# Rows sampled per crime type x month stratum
+APPROX_SAMPLE_PER_STRATUM = 200
+
+# Each HyperLogLog sketch has 2 ** HLL_PRECISION one-byte registers; the
+# relative standard error of a distinct count is 1.04 / sqrt(registers)
+HLL_PRECISION = 8
+
+# Normal quantile of the 95% confidence intervals
+Z_95 = 1.96
+
+# Precomputed stratified sample of crime_records with distinct crime_id sketches.
+# sample_cube counts the sampled rows per (month, crime_type, outcome_type) in
+# the CrimeCube layout; populations holds the size of every (month, crime_type)
+# stratum. sketches holds the HyperLogLog registers of the crime_ids of each
+# (month, crime_type, outcome_type) cell listed in sketch_cells.
+ApproxIndex = namedtuple('ApproxIndex', ['sample_cube', 'populations', 'sketch_cells', 'sketches'])
+
+SKETCH_COLUMNS = ['month', 'crime_type', 'outcome_type']
+
+def _leading_zeros(values):
+    """
+    Count the leading zero bits of uint64 values.
+    """
+    values = values.copy()
+    zeros = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = values < (np.uint64(1) << np.uint64(64 - shift))
+        zeros[empty] += shift
+        values[empty] <<= np.uint64(shift)
+    zeros[values == 0] = 64
+    return zeros
+
+def hash_registers(ids, precision=HLL_PRECISION):
+    """
+    Get the HyperLogLog register and rank of each id.
+    """
+    hashes = pd.util.hash_array(np.asarray(ids, dtype=object))
+    registers = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    remainder = hashes << np.uint64(precision)
+    ranks = np.minimum(_leading_zeros(remainder), 64 - precision) + 1
+    return registers, ranks.astype(np.uint8)
+
+def hll_estimate(registers):
+    """
+    Estimate the distinct count of a merged sketch, with the small-range correction.
+    """
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    empty = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and empty:
+        estimate = m * np.log(m / empty)
+    return estimate
+
+class ApproxBuilder:
+    """
+    Streaming builder of the ApproxIndex from chunks of month, crime_type, outcome_type and crime_id.
+
+    Every row gets a fixed random priority and each stratum keeps the rows
+    with the lowest priorities, so the sample is a uniform draw per stratum.
+    """
+
+    def __init__(self, per_stratum=APPROX_SAMPLE_PER_STRATUM, precision=HLL_PRECISION, seed=sampling.SAMPLE_SEED):
+        self.per_stratum = per_stratum
+        self.precision = precision
+        self.seed = seed
+        self.rows = 0
+        self.kept = None
+        self.populations = None
+        self.cells = None
+        self.registers = np.zeros((0, 2 ** precision), dtype=np.uint8)
+
+    def add(self, chunk):
+        """
+        Fold a chunk of crime_records rows into the sample, stratum sizes and sketches.
+        """
+        chunk = pd.DataFrame({
+            'month': data_processing.month_to_ordinal(chunk['month']).to_numpy(),
+            'crime_type': chunk['crime_type'].astype(object).to_numpy(),
+            'outcome_type': chunk['outcome_type'].astype(object).to_numpy(),
+            'crime_id': chunk['crime_id'].to_numpy(),
+        })
+        # Rows without a crime or outcome type can never be selected
+        chunk = chunk.dropna(subset=['crime_type', 'outcome_type'])
+        chunk['priority'] = np.random.default_rng([self.seed, self.rows]).random(len(chunk), dtype=np.float32)
+        self.rows += len(chunk)
+
+        sizes = chunk.groupby(['month', 'crime_type']).size()
+        self.populations = sizes if self.populations is None else self.populations.add(sizes, fill_value=0)
+
+        candidates = chunk[['month', 'crime_type', 'outcome_type', 'priority']]
+        if self.kept is not None:
+            candidates = pd.concat([self.kept, candidates], ignore_index=True)
+        candidates = candidates.sort_values('priority', kind='stable')
+        self.kept = candidates.groupby(['month', 'crime_type']).head(self.per_stratum).reset_index(drop=True)
+
+        self._add_sketches(chunk[chunk['crime_id'].notna()])
+
+    def _add_sketches(self, chunk):
+        """
+        Update the registers of the cells in a chunk with its crime_ids.
+        """
+        if chunk.empty:
+            return
+        keys = pd.MultiIndex.from_frame(chunk[SKETCH_COLUMNS])
+        new_cells = keys.unique() if self.cells is None else keys.unique().difference(self.cells)
+        self.cells = new_cells if self.cells is None else self.cells.append(new_cells)
+        if len(self.cells) > len(self.registers):
+            grown = np.zeros((max(len(self.cells), int(len(self.registers) * 1.5)), self.registers.shape[1]), dtype=np.uint8)
+            grown[:len(self.registers)] = self.registers
+            self.registers = grown
+
+        registers, ranks = hash_registers(chunk['crime_id'].astype(str), self.precision)
+        flat = self.cells.get_indexer(keys).astype(np.int64) * self.registers.shape[1] + registers
+        best = pd.Series(ranks).groupby(flat).max()
+        flat_registers = self.registers.reshape(-1)
+        positions = best.index.to_numpy()
+        flat_registers[positions] = np.maximum(flat_registers[positions], best.to_numpy())
+
+    def build(self):
+        """
+        Build the ApproxIndex from the rows added so far.
+        """
+        if self.kept is None or self.kept.empty:
+            return ApproxIndex(cube.build_cube(pd.DataFrame()), np.zeros((1, 0)), pd.DataFrame(columns=SKETCH_COLUMNS), self.registers[:0])
+
+        kept = self.kept.astype({'crime_type': 'category', 'outcome_type': 'category'})
+        sample_cube = cube.build_cube(kept)
+
+        # Stratum sizes in the (month, crime_type) axes of the sample cube
+        populations = np.zeros(sample_cube.counts.shape[:2])
+        months = self.populations.index.get_level_values('month').to_numpy().astype(np.int64)
+        n_months = sample_cube.counts.shape[0] - 1
+        month_index = np.where(months == data_processing.MISSING_MONTH, n_months, months - sample_cube.first_month)
+        crime_index = pd.Index(sample_cube.crime_types).get_indexer(self.populations.index.get_level_values('crime_type'))
+        populations[month_index, crime_index] = self.populations.to_numpy()
+
+        n_cells = 0 if self.cells is None else len(self.cells)
+        sketch_cells = self.cells.to_frame(index=False) if n_cells else pd.DataFrame(columns=SKETCH_COLUMNS)
+        logging.info(
+            f"Built approximate index from {self.rows} records: {len(kept)} sampled rows "
+            f"in {int(np.count_nonzero(populations))} strata, {n_cells} crime_id sketches."
+        )
+        return ApproxIndex(sample_cube, populations, sketch_cells, self.registers[:n_cells].copy())
+
+def build_index(chunks, per_stratum=APPROX_SAMPLE_PER_STRATUM):
+    """
+    Build the ApproxIndex from an iterable of crime_records chunks.
+    """
+    builder = ApproxBuilder(per_stratum)
+    for chunk in chunks:
+        builder.add(chunk)
+    return builder.build()
+
+def index_arrays(approx):
+    """
+    Split an ApproxIndex into named arrays and JSON metadata for the shared snapshot.
+    """
+    crime_types = pd.Categorical(approx.sketch_cells['crime_type'].astype(object))
+    outcome_types = pd.Categorical(approx.sketch_cells['outcome_type'].astype(object))
+    arrays = {
+        'sample_counts': approx.sample_cube.counts,
+        'populations': approx.populations,
+        'cell_months': approx.sketch_cells['month'].to_numpy(dtype=np.int64),
+        'cell_crime_codes': crime_types.codes,
+        'cell_outcome_codes': outcome_types.codes,
+        'sketches': approx.sketches,
+    }
+    info = {
+        'first_month': int(approx.sample_cube.first_month),
+        'crime_types': list(approx.sample_cube.crime_types),
+        'outcome_types': list(approx.sample_cube.outcome_types),
+        'cell_crime_types': crime_types.categories.tolist(),
+        'cell_outcome_types': outcome_types.categories.tolist(),
+    }
+    return arrays, info
+
+def index_from_arrays(arrays, info):
+    """
+    Rebuild an ApproxIndex from the arrays and metadata of index_arrays.
+    """
+    sample_cube = cube.CrimeCube(arrays['sample_counts'], info['first_month'], info['crime_types'], info['outcome_types'])
+    sketch_cells = pd.DataFrame({
+        'month': arrays['cell_months'],
+        'crime_type': pd.Categorical.from_codes(arrays['cell_crime_codes'], categories=info['cell_crime_types']).astype(object),
+        'outcome_type': pd.Categorical.from_codes(arrays['cell_outcome_codes'], categories=info['cell_outcome_types']).astype(object),
+    }, columns=SKETCH_COLUMNS)
+    return ApproxIndex(sample_cube, arrays['populations'], sketch_cells, arrays['sketches'])
+
+def _select(approx, selected_outcomes, selected_crimes, month_range):
+    """
+    Get the selection's sample counts per cell, stratum sample sizes and stratum
+    sizes, with the month-sliced sample cube and the category masks.
+    """
+    sample_cube = cube.select_months(approx.sample_cube, month_range)
+    populations = approx.populations
+    if month_range is not None:
+        months = cube.month_slice(approx.sample_cube, month_range)
+        populations = np.concatenate([populations[months], np.zeros((1, populations.shape[1]))])
+    crime_mask = np.isin(np.asarray(sample_cube.crime_types, dtype=object), list(selected_crimes or []))
+    outcome_mask = np.isin(np.asarray(sample_cube.outcome_types, dtype=object), list(selected_outcomes or []))
+    counts = sample_cube.counts[:, crime_mask]
+    return counts[:, :, outcome_mask], counts.sum(axis=2), populations[:, crime_mask], sample_cube, crime_mask, outcome_mask
+
+def estimate_cube(approx, selected_outcomes, selected_crimes, month_range=None):
+    """
+    Estimate the count cube of a selection by weighting each sampled row by its stratum.
+    """
+    matches, sampled, populations, sample_cube, crime_mask, outcome_mask = _select(
+        approx, selected_outcomes, selected_crimes, month_range
+    )
+    weights = np.divide(populations, sampled, out=np.zeros_like(populations), where=sampled > 0)
+    return cube.CrimeCube(
+        np.rint(matches * weights[:, :, np.newaxis]).astype(np.int64),
+        sample_cube.first_month,
+        [c for c, keep in zip(approx.sample_cube.crime_types, crime_mask) if keep],
+        [o for o, keep in zip(approx.sample_cube.outcome_types, outcome_mask) if keep]
+    )
+
+def estimate_total(approx, selected_outcomes, selected_crimes, month_range=None):
+    """
+    Estimate the row count of a selection and the half-width of its 95% confidence interval.
+
+    Strata are either fully selected by crime type or not at all, so only the
+    outcome filter contributes sampling error.
+    """
+    matches, sampled, populations, _, _, _ = _select(approx, selected_outcomes, selected_crimes, month_range)
+    matches = matches.sum(axis=2)
+    has_sample = sampled > 0
+    n, big_n = sampled[has_sample], populations[has_sample]
+    share = matches[has_sample] / n
+    # Stratified estimator with the finite population correction
+    variance = big_n ** 2 * (1 - n / big_n) * share * (1 - share) / np.maximum(n - 1, 1)
+    return float(np.sum(big_n * share)), Z_95 * float(np.sqrt(np.sum(variance)))
+
+def estimate_distinct_ids(approx, selected_outcomes, selected_crimes, month_range=None):
+    """
+    Estimate the distinct crime_ids of a selection and the half-width of its 95% confidence interval.
+    """
+    cells = approx.sketch_cells
+    selected = (cells['crime_type'].isin(list(selected_crimes or [])) & cells['outcome_type'].isin(list(selected_outcomes or []))).to_numpy()
+    if month_range is not None:
+        months = cells['month'].to_numpy()
+        selected &= (months >= month_range[0]) & (months <= month_range[1])
+    if not selected.any():
+        return 0.0, 0.0
+    merged = approx.sketches[selected].max(axis=0)
+    estimate = hll_estimate(merged)
+    return estimate, Z_95 * 1.04 / np.sqrt(len(merged)) * estimate
+
+def get_chart_data(approx, selected_outcomes, selected_crimes, month_range=None):
+    """
+    Estimate the aggregations behind the time series, bar charts and yearly comparison.
+    """
+    return cube.get_chart_data(estimate_cube(approx, selected_outcomes, selected_crimes, month_range))
+
+def get_summary_statistics(approx, selected_outcomes, selected_crimes, month_range=None):
+    """
+    Estimate the summary statistics, with confidence intervals for the totals.
+    """
+    summary = cube.get_summary_statistics(estimate_cube(approx, selected_outcomes, selected_crimes, month_range))
+    total, total_interval = estimate_total(approx, selected_outcomes, selected_crimes, month_range)
+    distinct_ids, distinct_interval = estimate_distinct_ids(approx, selected_outcomes, selected_crimes, month_range)
+    summary.update({
+        'total': int(round(total)),
+        'total_interval': int(round(total_interval)),
+        'distinct_crime_ids': int(round(distinct_ids)),
+        'distinct_crime_ids_interval': int(round(distinct_interval)),
+    })
+    return summary
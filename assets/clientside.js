@@ -0,0 +1,145 @@
+// clientside.js
+//
+// Clientside mode (CLIENTSIDE_MODE=1): the dashboard charts and summary
+// statistics are recomputed in the browser from the count cube the server
+// ships once in the 'cube-store' dcc.Store (see cube.get_payload). The figure
+// layouts come from the server with the page; only their trace data is
+// replaced here.
+
+const MONTH_NAMES = [
+    'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December'
+];
+
+function monthDate(ordinal) {
+    const month = ordinal % 12 + 1;
+    return Math.floor(ordinal / 12) + '-' + (month < 10 ? '0' : '') + month + '-01';
+}
+
+function monthName(ordinal) {
+    return MONTH_NAMES[ordinal % 12] + ' ' + Math.floor(ordinal / 12);
+}
+
+// Picked [first, last] month ordinals of the date range slider, or null when
+// it spans all the data (which also keeps crimes without a month)
+function monthWindow(value, firstMonth, lastMonth) {
+    if (!value || (value[0] <= firstMonth && value[1] >= lastMonth)) {
+        return null;
+    }
+    return value;
+}
+
+// Sum the selected cube cells per month, crime type and outcome type
+function aggregate(cube, selectedOutcomes, selectedCrimes, months) {
+    const [nMonths, nCrimes, nOutcomes] = cube.shape;
+    const crimeOk = cube.crime_types.map(c => (selectedCrimes || []).includes(c));
+    const outcomeOk = cube.outcome_types.map(o => (selectedOutcomes || []).includes(o));
+    const monthly = new Array(nMonths).fill(0);
+    const byCrime = new Array(nCrimes).fill(0);
+    const byOutcome = new Array(nOutcomes).fill(0);
+    const monthlyByCrime = cube.crime_types.map(() => new Array(nMonths).fill(0));
+    let total = 0;
+
+    for (let i = 0; i < cube.cells.length; i++) {
+        const cell = cube.cells[i];
+        const outcome = cell % nOutcomes;
+        const crime = Math.floor(cell / nOutcomes) % nCrimes;
+        if (!crimeOk[crime] || !outcomeOk[outcome]) {
+            continue;
+        }
+        const month = Math.floor(cell / (nOutcomes * nCrimes));
+        if (months && (month === nMonths - 1 || cube.first_month + month < months[0] || cube.first_month + month > months[1])) {
+            continue;
+        }
+        const count = cube.counts[i];
+        monthly[month] += count;
+        byCrime[crime] += count;
+        byOutcome[outcome] += count;
+        monthlyByCrime[crime][month] += count;
+        total += count;
+    }
+    return {monthly, byCrime, byOutcome, monthlyByCrime, total};
+}
+
+// Labels and counts sorted in descending order with zero counts dropped
+function ranked(labels, counts) {
+    const order = labels.map((_, i) => i)
+        .filter(i => counts[i] > 0)
+        .sort((a, b) => counts[b] - counts[a] || a - b);
+    return {x: order.map(i => labels[i]), y: order.map(i => counts[i])};
+}
+
+function withTraces(figure, traces) {
+    return Object.assign({}, figure, {
+        data: figure.data.map((trace, i) => Object.assign({}, trace, traces[i]))
+    });
+}
+
+function li(text) {
+    return {namespace: 'dash_html_components', type: 'Li', props: {children: text, style: {color: '#e0e0e0'}}};
+}
+
+// Date range slider tooltips
+window.dccFunctions = Object.assign({}, window.dccFunctions, {
+    monthLabel: function(ordinal) {
+        return MONTH_NAMES[ordinal % 12].slice(0, 3) + ' ' + Math.floor(ordinal / 12);
+    }
+});
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    crime: {
+        update_charts: function(selectedOutcomes, selectedCrimes, monthRange, cube, firstMonth, lastMonth,
+                                timeSeries, outcomeBar, crimeTypeBar, yearly) {
+            const totals = aggregate(cube, selectedOutcomes, selectedCrimes, monthWindow(monthRange, firstMonth, lastMonth));
+            // The last month slot holds crimes without a month
+            const months = totals.monthly.slice(0, -1);
+            const dated = months.map((_, i) => i).filter(i => months[i] > 0);
+
+            // Yearly comparison: one trace per crime type, named by the server
+            const yearlyTraces = yearly.data.map(trace => {
+                const crime = cube.crime_types.indexOf(trace.name);
+                const counts = {};
+                if (crime >= 0) {
+                    totals.monthlyByCrime[crime].slice(0, -1).forEach((count, i) => {
+                        const year = Math.floor((cube.first_month + i) / 12);
+                        counts[year] = (counts[year] || 0) + count;
+                    });
+                }
+                const years = Object.keys(counts).map(Number).filter(y => counts[y] > 0).sort((a, b) => a - b);
+                return {x: years, y: years.map(y => counts[y])};
+            });
+
+            return [
+                withTraces(timeSeries, [{
+                    x: dated.map(i => monthDate(cube.first_month + i)),
+                    y: dated.map(i => months[i])
+                }]),
+                withTraces(outcomeBar, [ranked(cube.outcome_types, totals.byOutcome)]),
+                withTraces(crimeTypeBar, [ranked(cube.crime_types, totals.byCrime)]),
+                withTraces(yearly, yearlyTraces)
+            ];
+        },
+
+        update_summary_statistics: function(selectedOutcomes, selectedCrimes, monthRange, cube, firstMonth, lastMonth) {
+            const totals = aggregate(cube, selectedOutcomes, selectedCrimes, monthWindow(monthRange, firstMonth, lastMonth));
+            const months = totals.monthly.slice(0, -1);
+            const dated = months.map((_, i) => i).filter(i => months[i] > 0);
+            const crimes = ranked(cube.crime_types, totals.byCrime);
+            const outcomes = ranked(cube.outcome_types, totals.byOutcome);
+            const covered = dated.length ? [
+                monthName(cube.first_month + dated[0]),
+                monthName(cube.first_month + dated[dated.length - 1])
+            ] : ['N/A', 'N/A'];
+
+            return [
+                {namespace: 'dash_html_components', type: 'H2', props: {children: 'Summary Statistics', style: {color: '#e0e0e0'}}},
+                {namespace: 'dash_html_components', type: 'Ul', props: {children: [
+                    li('Total number of crimes: ' + totals.total),
+                    li('Most common crime type: ' + (crimes.x[0] || 'N/A')),
+                    li('Most common outcome type: ' + (outcomes.x[0] || 'N/A')),
+                    li('Data covers from ' + covered[0] + ' to ' + covered[1])
+                ]}}
+            ];
+        }
+    }
+});
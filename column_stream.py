@@ -0,0 +1,205 @@
+# column_stream.py
+
+import io
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy import text
+
+import data_processing
+
+# Bytes of COPY output decoded per batch
+STREAM_BATCH_BYTES = 8 * 1024 * 1024
+
+# Rows per chunk when reading through pandas instead of COPY
+READ_CHUNK_ROWS = 200000
+
+# The dashboard columns, with the month already converted to its ordinal by the
+# database so no datetimes are ever materialised
+SELECT_COLUMNS = """
+    (EXTRACT(YEAR FROM month) * 12 + EXTRACT(MONTH FROM month) - 1)::int AS month,
+    crime_type, outcome_type, latitude, longitude
+"""
+
+class ColumnBuilder:
+    """
+    Preallocated typed arrays that CSV batches of the dashboard columns are decoded into.
+
+    Crime and outcome types are dictionary-encoded as they arrive, so only
+    their distinct labels are ever held as Python strings.
+    """
+
+    def __init__(self, capacity):
+        self.size = 0
+        self.month = np.empty(capacity, dtype=np.int16)
+        self.latitude = np.empty(capacity, dtype=np.float32)
+        self.longitude = np.empty(capacity, dtype=np.float32)
+        self.codes = {column: np.empty(capacity, dtype=np.int16) for column in ('crime_type', 'outcome_type')}
+        self.labels = {column: {} for column in ('crime_type', 'outcome_type')}
+
+    def _reserve(self, rows):
+        """
+        Grow the arrays if rows were added to the table after it was counted.
+        """
+        needed = self.size + rows
+        if needed <= len(self.month):
+            return
+        capacity = max(needed, int(len(self.month) * 1.5))
+        self.month = np.resize(self.month, capacity)
+        self.latitude = np.resize(self.latitude, capacity)
+        self.longitude = np.resize(self.longitude, capacity)
+        self.codes = {column: np.resize(codes, capacity) for column, codes in self.codes.items()}
+
+    def _encode(self, column, values):
+        """
+        Map a batch's categorical values to the codes of the column's dictionary.
+        """
+        labels = self.labels[column]
+        lookup = np.array([labels.setdefault(label, len(labels)) for label in values.cat.categories] + [-1], dtype=np.int16)
+        # Missing values have code -1, which picks the trailing -1 of lookup
+        return lookup[values.cat.codes.to_numpy()]
+
+    def add_csv(self, chunk):
+        """
+        Decode a chunk of complete CSV lines into the arrays.
+        """
+        batch = pd.read_csv(
+            io.BytesIO(chunk),
+            header=None,
+            names=data_processing.DASHBOARD_COLUMNS,
+            dtype={'month': 'float64', 'crime_type': 'category', 'outcome_type': 'category',
+                   'latitude': 'float32', 'longitude': 'float32'}
+        )
+        rows = len(batch)
+        self._reserve(rows)
+        end = self.size + rows
+        month = batch['month'].to_numpy()
+        self.month[self.size:end] = np.where(np.isnan(month), data_processing.MISSING_MONTH, month)
+        self.latitude[self.size:end] = batch['latitude'].to_numpy()
+        self.longitude[self.size:end] = batch['longitude'].to_numpy()
+        for column in self.codes:
+            self.codes[column][self.size:end] = self._encode(column, batch[column])
+        self.size = end
+
+    def to_frame(self):
+        """
+        Build the compact crime data, with categories in sorted order like compact_crime_data.
+        """
+        columns = {
+            'month': pd.Series(self.month[:self.size], copy=False),
+        }
+        for column in ('crime_type', 'outcome_type'):
+            values = pd.Categorical.from_codes(self.codes[column][:self.size], categories=list(self.labels[column]))
+            columns[column] = pd.Series(values.reorder_categories(sorted(self.labels[column])), copy=False)
+        columns['latitude'] = pd.Series(self.latitude[:self.size], copy=False)
+        columns['longitude'] = pd.Series(self.longitude[:self.size], copy=False)
+        return pd.DataFrame(columns, copy=False)
+
+class CopySink:
+    """
+    File-like target for COPY ... TO STDOUT that decodes the output in batches of whole lines.
+    """
+
+    def __init__(self, builder, batch_bytes=STREAM_BATCH_BYTES):
+        self.builder = builder
+        self.batch_bytes = batch_bytes
+        self.parts = []
+        self.buffered = 0
+
+    def write(self, data):
+        self.parts.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.batch_bytes:
+            self.flush()
+
+    def flush(self):
+        buffer = b''.join(self.parts)
+        # Keep a trailing partial line for the next batch
+        end = buffer.rfind(b'\n') + 1
+        if end:
+            self.builder.add_csv(buffer[:end])
+        self.parts = [buffer[end:]] if end < len(buffer) else []
+        self.buffered = len(buffer) - end
+
+def supports_copy(conn):
+    """
+    Check whether a connection's driver has psycopg2's copy_expert, which read_crime_columns needs.
+    """
+    return conn.dialect.driver == 'psycopg2'
+
+def read_crime_columns(conn, after_month=None):
+    """
+    Stream the dashboard columns of crime_records into the compact crime data.
+
+    conn is a SQLAlchemy connection to PostgreSQL through psycopg2. With
+    after_month (a month ordinal) only rows of later months are read.
+    """
+    start = time.time()
+    where = ""
+    if after_month is not None:
+        # Rows dated within the after_month itself are already loaded
+        first_month = data_processing.ordinal_to_month([after_month + 1])[0].date()
+        where = f"WHERE month >= '{first_month.isoformat()}'::date"
+
+    # Size the arrays up front; rows inserted meanwhile make them grow
+    rows = conn.exec_driver_sql(f"SELECT COUNT(*) FROM crime_records {where}").scalar()
+    builder = ColumnBuilder(rows)
+    sink = CopySink(builder)
+
+    # Sorted by the database, undated rows first, so sort_by_month has nothing left to do
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY (SELECT {SELECT_COLUMNS} FROM crime_records {where} ORDER BY month NULLS FIRST) TO STDOUT WITH (FORMAT csv)",
+            sink
+        )
+    finally:
+        cursor.close()
+    sink.flush()
+
+    data = builder.to_frame()
+    elapsed = time.time() - start
+    logging.info(
+        f"Streamed {len(data)} records ({data.memory_usage(deep=True).sum() / 1e6:.1f} MB) "
+        f"in {elapsed:.1f}s ({len(data) / max(elapsed, 1e-9):.0f} rows/s)."
+    )
+    return data
+
+def _concat_compact(frames):
+    """
+    Concatenate compact crime data chunks, merging their category dictionaries.
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    columns = {}
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            merged = union_categoricals([frame[column] for frame in frames], sort_categories=True)
+            columns[column] = pd.Series(merged)
+        else:
+            columns[column] = pd.concat([frame[column] for frame in frames], ignore_index=True)
+    return pd.DataFrame(columns)
+
+def read_crime_frames(conn, after_month=None, chunksize=READ_CHUNK_ROWS):
+    """
+    Read the dashboard columns of crime_records through pandas, chunksize rows at a time.
+
+    The fallback of read_crime_columns for drivers without COPY support and
+    for local stand-ins such as SQLite. Each chunk is compacted as it arrives.
+    """
+    query = f"SELECT {', '.join(data_processing.DASHBOARD_COLUMNS)} FROM crime_records"
+    params = {}
+    if after_month is not None:
+        query += " WHERE month >= :start_month"
+        params['start_month'] = data_processing.ordinal_to_month([after_month + 1])[0].to_pydatetime()
+    query += " ORDER BY month NULLS FIRST"
+
+    stream = conn.execution_options(stream_results=True)
+    chunks = pd.read_sql(text(query), stream, params=params, parse_dates=['month'], chunksize=chunksize)
+    return _concat_compact([data_processing.compact_crime_data(chunk) for chunk in chunks])
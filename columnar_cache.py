@@ -0,0 +1,66 @@
+# columnar_cache.py
+
+import logging
+import os
+import tempfile
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # The local cache is disabled without pyarrow
+    pa = None
+
+# Schema metadata key holding the database freshness token of the cached data
+TOKEN_KEY = b'freshness_token'
+
+def read_token(path):
+    """
+    Get the freshness token a cache file was written with, or None if there is no usable file.
+    """
+    if pa is None or not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid) as e:
+        logging.warning(f"Ignoring unreadable data cache {path}: {e}")
+        return None
+    token = metadata.get(TOKEN_KEY)
+    return token.decode() if token is not None else None
+
+def read_cache(path, token):
+    """
+    Read the compact crime data from a cache file if it was written with token.
+
+    A token of None accepts whatever the file holds. Returns None when the file
+    is missing or stale.
+    """
+    cached_token = read_token(path)
+    if cached_token is None or (token is not None and cached_token != token):
+        return None
+    data = feather.read_table(path, memory_map=True).to_pandas()
+    logging.info(f"Loaded {len(data)} records from the data cache {path} (token {cached_token}).")
+    return data
+
+def write_cache(df, path, token):
+    """
+    Write the compact crime data to a zstd-compressed Feather file tagged with token.
+    """
+    if pa is None:
+        logging.warning("pyarrow is not installed, not writing the data cache.")
+        return
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), TOKEN_KEY: token.encode()})
+
+    # Write next to the target and rename, so readers never see a partial file
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logging.info(f"Wrote {len(df)} records to the data cache {path} (token {token}).")
@@ -0,0 +1,232 @@
+# cube.py
+
+import logging
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import data_processing
+
+# Counts of crimes indexed by (month, crime_type, outcome_type).
+# The month axis covers every month from first_month onwards plus one trailing
+# slot holding rows whose month is missing.
+CrimeCube = namedtuple('CrimeCube', ['counts', 'first_month', 'crime_types', 'outcome_types'])
+
+def build_cube(df):
+    """
+    Build the month x crime_type x outcome_type count cube from the compact crime data.
+    """
+    if df.empty:
+        return CrimeCube(np.zeros((1, 0, 0), dtype=np.int64), 0, [], [])
+
+    crime_codes = df['crime_type'].cat.codes.to_numpy()
+    outcome_codes = df['outcome_type'].cat.codes.to_numpy()
+    months = df['month'].to_numpy()
+
+    # Rows without a crime or outcome type can never be selected in the dropdowns
+    keep = (crime_codes >= 0) & (outcome_codes >= 0)
+    crime_codes, outcome_codes, months = crime_codes[keep], outcome_codes[keep], months[keep]
+
+    dated = months != data_processing.MISSING_MONTH
+    first_month = int(months[dated].min()) if dated.any() else 0
+    n_months = int(months[dated].max()) - first_month + 1 if dated.any() else 0
+    month_index = np.where(dated, months.astype(np.int64) - first_month, n_months)
+
+    crime_types = df['crime_type'].cat.categories.tolist()
+    outcome_types = df['outcome_type'].cat.categories.tolist()
+    shape = (n_months + 1, len(crime_types), len(outcome_types))
+
+    flat_index = (month_index * shape[1] + crime_codes) * shape[2] + outcome_codes
+    counts = np.bincount(flat_index, minlength=np.prod(shape)).reshape(shape)
+    logging.info(f"Built count cube of shape {shape} from {len(df)} records.")
+    return CrimeCube(counts, first_month, crime_types, outcome_types)
+
+def _selection_mask(labels, selected):
+    """
+    Boolean mask over a cube axis for the selected labels.
+    """
+    return np.isin(np.asarray(labels, dtype=object), list(selected or []))
+
+def select(cube, selected_outcomes, selected_crimes):
+    """
+    Slice the cube down to the selected outcome and crime types.
+    """
+    crime_mask = _selection_mask(cube.crime_types, selected_crimes)
+    outcome_mask = _selection_mask(cube.outcome_types, selected_outcomes)
+    counts = cube.counts[:, crime_mask][:, :, outcome_mask]
+    return CrimeCube(
+        counts,
+        cube.first_month,
+        [c for c, keep in zip(cube.crime_types, crime_mask) if keep],
+        [o for o, keep in zip(cube.outcome_types, outcome_mask) if keep]
+    )
+
+def month_slice(cube, month_range):
+    """
+    Get the slice of the cube's dated months between the first and last month ordinals of month_range.
+    """
+    n_months = cube.counts.shape[0] - 1
+    start = min(max(month_range[0] - cube.first_month, 0), n_months)
+    stop = min(max(month_range[1] - cube.first_month + 1, start), n_months)
+    return slice(start, stop)
+
+def select_months(cube, month_range):
+    """
+    Slice the cube down to the months of month_range.
+
+    A month_range of None keeps every month, including crimes without one;
+    otherwise those crimes are left out.
+    """
+    if month_range is None:
+        return cube
+    months = month_slice(cube, month_range)
+    undated = np.zeros((1,) + cube.counts.shape[1:], dtype=cube.counts.dtype)
+    return CrimeCube(
+        np.concatenate([cube.counts[months], undated]),
+        cube.first_month + months.start,
+        cube.crime_types,
+        cube.outcome_types
+    )
+
+def build_prefix_sums(cube):
+    """
+    Get the cumulative monthly counts per crime and outcome type, starting with a row of zeros.
+
+    prefix[j] - prefix[i] counts the crimes of dated months i to j - 1 of the cube.
+    """
+    dated = cube.counts[:-1]
+    prefix = np.zeros((len(dated) + 1,) + dated.shape[1:], dtype=np.int64)
+    np.cumsum(dated, axis=0, out=prefix[1:])
+    return prefix
+
+def _ranked_counts(labels, counts, column):
+    """
+    Labelled counts sorted in descending order with zero counts dropped.
+    """
+    order = np.argsort(-counts, kind='stable')
+    ranked = pd.DataFrame({
+        column: np.asarray(labels, dtype=object)[order],
+        'Count': counts[order]
+    })
+    return ranked[ranked['Count'] > 0].reset_index(drop=True)
+
+def get_outcome_counts(cube):
+    """
+    Get counts of crimes per outcome type.
+    """
+    return _ranked_counts(cube.outcome_types, cube.counts.sum(axis=(0, 1)), 'outcome_type')
+
+def get_crime_type_counts(cube):
+    """
+    Get counts of crimes per crime type.
+    """
+    return _ranked_counts(cube.crime_types, cube.counts.sum(axis=(0, 2)), 'crime_type')
+
+def get_time_series_data(cube):
+    """
+    Get time series data of crime counts per month.
+    """
+    monthly = cube.counts[:-1].sum(axis=(1, 2))
+    months = np.flatnonzero(monthly)
+    return pd.DataFrame({
+        'month': data_processing.ordinal_to_month(cube.first_month + months),
+        'Count': monthly[months]
+    })
+
+def get_yearly_comparison(cube):
+    """
+    Compare how the most popular types of crimes have changed over each year.
+    """
+    monthly = cube.counts[:-1].sum(axis=2)
+    years = (cube.first_month + np.arange(len(monthly))) // 12
+    yearly = pd.DataFrame(monthly, columns=cube.crime_types).groupby(years).sum()
+    yearly_comparison = yearly.rename_axis('Year').melt(
+        ignore_index=False, var_name='crime_type', value_name='Count'
+    ).reset_index()
+    yearly_comparison = yearly_comparison[yearly_comparison['Count'] > 0]
+    return yearly_comparison.sort_values(['Year', 'crime_type']).reset_index(drop=True)
+
+def get_chart_data(cube):
+    """
+    Get the aggregations behind the time series, bar charts and yearly comparison.
+    """
+    return {
+        'time_series': get_time_series_data(cube),
+        'outcome_counts': get_outcome_counts(cube),
+        'crime_type_counts': get_crime_type_counts(cube),
+        'yearly_comparison': get_yearly_comparison(cube),
+    }
+
+def get_summary_statistics(cube):
+    """
+    Get the total count, most common crime and outcome types and the months covered.
+    """
+    crime_type_counts = get_crime_type_counts(cube)
+    outcome_counts = get_outcome_counts(cube)
+    dated_months = np.flatnonzero(cube.counts[:-1].sum(axis=(1, 2)))
+
+    first_month, last_month = None, None
+    if len(dated_months):
+        first_month, last_month = data_processing.ordinal_to_month(
+            cube.first_month + dated_months[[0, -1]]
+        )
+
+    return {
+        'total': int(cube.counts.sum()),
+        'most_common_crime_type': crime_type_counts.iloc[0]['crime_type'] if not crime_type_counts.empty else None,
+        'most_common_outcome_type': outcome_counts.iloc[0]['outcome_type'] if not outcome_counts.empty else None,
+        'first_month': first_month,
+        'last_month': last_month,
+    }
+
+def get_range_summary_statistics(cube, prefix, selected_outcomes, selected_crimes, month_range):
+    """
+    Get the summary statistics of a selection over a month range from the prefix sums.
+
+    The totals per crime and outcome type are differences of two prefix rows,
+    so their cost does not depend on the length of the range.
+    """
+    crime_mask = _selection_mask(cube.crime_types, selected_crimes)
+    outcome_mask = _selection_mask(cube.outcome_types, selected_outcomes)
+    n_months = cube.counts.shape[0] - 1
+    months = slice(0, n_months) if month_range is None else month_slice(cube, month_range)
+
+    totals = (prefix[months.stop] - prefix[months.start])[crime_mask][:, outcome_mask]
+    if month_range is None:
+        totals = totals + cube.counts[-1][crime_mask][:, outcome_mask]
+    crime_type_counts = _ranked_counts(np.asarray(cube.crime_types, dtype=object)[crime_mask], totals.sum(axis=1), 'crime_type')
+    outcome_counts = _ranked_counts(np.asarray(cube.outcome_types, dtype=object)[outcome_mask], totals.sum(axis=0), 'outcome_type')
+
+    # First and last months with crimes: binary search on the selection's cumulative counts
+    cumulative = prefix[:, crime_mask][:, :, outcome_mask].sum(axis=(1, 2))
+    first_month, last_month = None, None
+    if cumulative[months.stop] > cumulative[months.start]:
+        first = np.searchsorted(cumulative, cumulative[months.start], side='right') - 1
+        last = np.searchsorted(cumulative, cumulative[months.stop], side='left') - 1
+        first_month, last_month = data_processing.ordinal_to_month(cube.first_month + np.array([first, last]))
+
+    return {
+        'total': int(totals.sum()),
+        'most_common_crime_type': crime_type_counts.iloc[0]['crime_type'] if not crime_type_counts.empty else None,
+        'most_common_outcome_type': outcome_counts.iloc[0]['outcome_type'] if not outcome_counts.empty else None,
+        'first_month': first_month,
+        'last_month': last_month,
+    }
+
+def get_payload(cube):
+    """
+    Get the cube as a JSON-ready dict for the browser.
+
+    Only the non-zero cells are sent, as flat indices into the
+    (month, crime type, outcome type) shape with their counts.
+    """
+    cells = np.flatnonzero(cube.counts)
+    return {
+        'first_month': int(cube.first_month),
+        'shape': list(cube.counts.shape),
+        'crime_types': list(cube.crime_types),
+        'outcome_types': list(cube.outcome_types),
+        'cells': cells.tolist(),
+        'counts': cube.counts.ravel()[cells].tolist(),
+    }
@@ -1,14 +1,102 @@
 # data_processing.py
 
+import numpy as np
 import pandas as pd
 import logging
 
+# Columns the dashboard actually uses; everything else is dropped at load time
+DASHBOARD_COLUMNS = ['month', 'crime_type', 'outcome_type', 'latitude', 'longitude']
+
+# Month ordinal used for rows whose 'month' could not be parsed
+MISSING_MONTH = -1
+
+def month_to_ordinal(months):
+    """
+    Convert a datetime Series to int16 month ordinals (year * 12 + month - 1).
+    """
+    months = pd.to_datetime(months, errors='coerce')
+    ordinals = months.dt.year * 12 + months.dt.month - 1
+    return ordinals.fillna(MISSING_MONTH).astype('int16')
+
+def ordinal_to_month(ordinals):
+    """
+    Convert month ordinals back to month-start Timestamps.
+    """
+    ordinals = pd.Series(ordinals).astype('int64')
+    return pd.to_datetime(pd.DataFrame({
+        'year': ordinals // 12,
+        'month': ordinals % 12 + 1,
+        'day': 1
+    }))
+
+def is_month_ordinal(months):
+    """
+    Check whether a 'month' column holds compact month ordinals.
+    """
+    return pd.api.types.is_integer_dtype(months)
+
+def sort_by_month(df):
+    """
+    Order the compact crime data by month, undated rows first, keeping the row order within a month.
+    """
+    if df.empty or df['month'].is_monotonic_increasing:
+        return df
+    order = np.argsort(df['month'].to_numpy(), kind='stable')
+    return df.take(order).reset_index(drop=True)
+
+def month_rows(df, month_range):
+    """
+    Get the slice of month-sorted rows between the first and last month ordinals of month_range.
+    """
+    months = df['month'].to_numpy()
+    return slice(
+        int(np.searchsorted(months, month_range[0], side='left')),
+        int(np.searchsorted(months, month_range[1], side='right'))
+    )
+
+def compact_crime_data(df):
+    """
+    Build the compact in-memory representation of the crime data.
+
+    Only DASHBOARD_COLUMNS are kept: crime and outcome types are stored as
+    categoricals, coordinates as float32 and the month as an int16 ordinal.
+    """
+    if df.empty:
+        return df
+
+    compact = pd.DataFrame({
+        'month': month_to_ordinal(df['month']),
+        'crime_type': df['crime_type'].astype('category'),
+        'outcome_type': df['outcome_type'].astype('category'),
+        'latitude': pd.to_numeric(df['latitude'], errors='coerce').astype('float32'),
+        'longitude': pd.to_numeric(df['longitude'], errors='coerce').astype('float32'),
+    })
+    logging.info(
+        f"Compacted crime data from {df.memory_usage(deep=True).sum() / 1e6:.1f} MB "
+        f"to {compact.memory_usage(deep=True).sum() / 1e6:.1f} MB."
+    )
+    return compact
+
+def get_month_range(df):
+    """
+    Get the first and last month covered by the data as Timestamps.
+    """
+    if is_month_ordinal(df['month']):
+        months = df['month'][df['month'] != MISSING_MONTH]
+        if months.empty:
+            return None, None
+        first, last = ordinal_to_month([months.min(), months.max()])
+        return first, last
+    return df['month'].min(), df['month'].max()
+
 def get_outcome_counts(df):
     """
     Get counts of crimes per outcome type.
     """
     outcome_counts = df['outcome_type'].value_counts().reset_index()
     outcome_counts.columns = ['outcome_type', 'Count']
+    # Categorical columns report unused categories with a zero count
+    outcome_counts = outcome_counts[outcome_counts['Count'] > 0]
     logging.info(f"Outcome Counts:\n{outcome_counts.head()}")
     return outcome_counts
 
@@ -18,6 +106,8 @@ def get_crime_type_counts(df):
     """
     crime_type_counts = df['crime_type'].value_counts().reset_index()
     crime_type_counts.columns = ['crime_type', 'Count']
+    # Categorical columns report unused categories with a zero count
+    crime_type_counts = crime_type_counts[crime_type_counts['Count'] > 0]
     logging.info(f"Crime Type Counts:\n{crime_type_counts.head()}")
     return crime_type_counts
 
@@ -25,31 +115,47 @@ def get_time_series_data(df):
     """
     Get time series data of crime counts per month.
     """
+    if is_month_ordinal(df['month']):
+        months = df['month'][df['month'] != MISSING_MONTH]
+        dropped_count = len(df) - len(months)
+        if dropped_count > 0:
+            logging.warning(f"Dropped {dropped_count} rows due to invalid 'month' values.")
+
+        time_series = months.value_counts().sort_index().reset_index()
+        time_series.columns = ['month', 'Count']
+        time_series['month'] = ordinal_to_month(time_series['month'])
+        return time_series
+
     # Ensure the 'month' column is in datetime format
     if not pd.api.types.is_datetime64_any_dtype(df['month']):
         df['month'] = pd.to_datetime(df['month'], errors='coerce')
-    
+
     # Drop rows with invalid 'month' dates
     initial_count = len(df)
     df = df.dropna(subset=['month'])
     dropped_count = initial_count - len(df)
     if dropped_count > 0:
         logging.warning(f"Dropped {dropped_count} rows due to invalid 'month' values.")
-    
+
     # Group by month and count occurrences
     time_series = df.groupby(df['month'].dt.to_period('M')).size().reset_index(name='Count')
-    
+
     # Convert Period to Timestamp for Plotly
     time_series['month'] = time_series['month'].dt.to_timestamp()
-    
+
     return time_series
 
 def get_yearly_comparison(df):
     """
     Compare how the most popular types of crimes have changed over each year.
     """
-    df_copy = df.copy()
-    df_copy['Year'] = df_copy['month'].dt.year
-    yearly_comparison = df_copy.groupby(['Year', 'crime_type']).size().reset_index(name='Count')
+    if is_month_ordinal(df['month']):
+        dated = df[df['month'] != MISSING_MONTH]
+        years = (dated['month'] // 12).rename('Year')
+        yearly_comparison = dated.groupby([years, 'crime_type'], observed=True).size().reset_index(name='Count')
+    else:
+        df_copy = df.copy()
+        df_copy['Year'] = df_copy['month'].dt.year
+        yearly_comparison = df_copy.groupby(['Year', 'crime_type'], observed=True).size().reset_index(name='Count')
     logging.info(f"Yearly Comparison Data:\n{yearly_comparison.head()}")
     return yearly_comparison
@@ -0,0 +1,74 @@
+# dataset.py
+
+import logging
+from collections import namedtuple
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+import cube
+import data_processing
+import density
+import row_index
+import sampling
+import spatial_index
+
+# One immutable version of the loaded data together with the structures built
+# from it. Callbacks read the current Dataset once and the refresher replaces it
+# as a whole, so a request never sees a cube or index from a different version.
+# spatial and priorities back the viewport sampler of the scatter map. The data
+# is sorted by month, so a date range is a contiguous slice of rows, and prefix
+# holds the cube's cumulative monthly counts for range totals.
+Dataset = namedtuple('Dataset', ['data', 'cube', 'prefix', 'index', 'density', 'spatial', 'priorities', 'version', 'watermark'])
+
+def get_watermark(df):
+    """
+    Get the latest month ordinal in the data, or None if no month is known.
+    """
+    if df.empty:
+        return None
+    months = df['month'][df['month'] != data_processing.MISSING_MONTH]
+    return int(months.max()) if not months.empty else None
+
+def build_dataset(df, density_pyramid=None):
+    """
+    Build the count cube, row index, density pyramid and spatial index for the compact crime data.
+
+    A density_pyramid already built for df (as mapped from its snapshot) is used as is.
+    """
+    # Loaded data is already sorted; this only copies data that is not
+    df = data_processing.sort_by_month(df)
+    watermark = get_watermark(df)
+    crime_cube = cube.build_cube(df)
+    lat = df['latitude'].to_numpy() if not df.empty else []
+    lon = df['longitude'].to_numpy() if not df.empty else []
+    return Dataset(
+        df,
+        crime_cube,
+        cube.build_prefix_sums(crime_cube),
+        row_index.build_row_index(df),
+        density_pyramid if density_pyramid is not None else density.build_pyramid(df),
+        spatial_index.build_index(lat, lon),
+        sampling.row_priorities(len(df)),
+        f"{len(df)}-{watermark}",
+        watermark
+    )
+
+def append_rows(df, new_rows):
+    """
+    Append compact rows to the compact crime data, merging the category dictionaries.
+    """
+    if df.empty:
+        return new_rows
+    if new_rows.empty:
+        return df
+
+    columns = {}
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            columns[column] = pd.Series(union_categoricals([df[column], new_rows[column].astype('category')]))
+        else:
+            columns[column] = pd.concat([df[column], new_rows[column]], ignore_index=True)
+    appended = pd.DataFrame(columns)
+    logging.info(f"Appended {len(new_rows)} records to {len(df)} existing records.")
+    return appended
@@ -0,0 +1,91 @@
+# db.py
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL, make_url
+
+load_dotenv()
+
+# Engines by (url, statement timeout), one per process
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_database_url():
+    """
+    Build the PostgreSQL URL from the .env settings.
+
+    DATABASE_URL is used as is when set. Otherwise DB_USER, DB_PASSWORD and
+    DB_NAME are combined with the Cloud SQL unix socket of
+    INSTANCE_CONNECTION_NAME when it is set, or with TCP to DB_HOST:DB_PORT.
+    """
+    if os.getenv('DATABASE_URL'):
+        return make_url(os.getenv('DATABASE_URL'))
+
+    instance = os.getenv('INSTANCE_CONNECTION_NAME')
+    return URL.create(
+        'postgresql+psycopg2',
+        username=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=None if instance else os.getenv('DB_HOST', 'localhost'),
+        port=None if instance else int(os.getenv('DB_PORT', 5432)),
+        database=os.getenv('DB_NAME'),
+        query={'host': f"/cloudsql/{instance}"} if instance else {}
+    )
+
+def get_engine(url=None, statement_timeout_ms=None):
+    """
+    Get the pooled engine for url (the .env database by default), shared by the whole process.
+
+    statement_timeout_ms defaults to DB_STATEMENT_TIMEOUT_MS; 0 disables it.
+    """
+    with _engines_lock:
+        key = (url, statement_timeout_ms)
+        if key not in _engines:
+            _engines[key] = _create_engine(url, statement_timeout_ms)
+        return _engines[key]
+
+def _create_engine(url, statement_timeout_ms):
+    """
+    Create an engine with the pool settings from the environment.
+    """
+    url = make_url(url) if url else get_database_url()
+    if url.get_backend_name() != 'postgresql':
+        # Local stand-ins (e.g. SQLite) keep their dialect's default pool
+        return create_engine(url)
+
+    if statement_timeout_ms is None:
+        statement_timeout_ms = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+    logging.info(f"Creating database engine for {url.render_as_string(hide_password=True)}.")
+    return create_engine(
+        url,
+        pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 5)),
+        pool_pre_ping=True,
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        connect_args={'options': f"-c statement_timeout={statement_timeout_ms}"}
+    )
+
+def _forget_inherited_connections():
+    """
+    Drop pooled connections inherited from the parent process without closing them.
+    """
+    for engine in _engines.values():
+        engine.dispose(close=False)
+
+# Forked processes (e.g. background callback jobs) must open their own connections
+os.register_at_fork(after_in_child=_forget_inherited_connections)
+
+@contextmanager
+def bulk_connection(engine):
+    """
+    Connection for full-table reads, with the statement timeout lifted for its transaction only.
+    """
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            conn.execute(text("SET LOCAL statement_timeout = 0"))
+        yield conn
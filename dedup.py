@@ -0,0 +1,77 @@
+# dedup.py
+
+import numpy as np
+import pandas as pd
+
+# Distinct hash keys so a crime_id can never collide with a full-row hash by design
+CRIME_ID_HASH_KEY = 'crime_id_key0000'
+ROW_HASH_KEY = 'full_row_key0000'
+
+def row_keys(df, id_column='crime_id', ignore_columns=('source_file',)):
+    """
+    Get a 64-bit dedup key per row: the hash of its crime_id, or of the full row when it has none.
+    """
+    has_id = df[id_column].notna().to_numpy() if id_column in df.columns else np.zeros(len(df), dtype=bool)
+    keys = np.empty(len(df), dtype=np.uint64)
+
+    if has_id.any():
+        ids = df.loc[has_id, id_column].astype(str).to_numpy(dtype=object)
+        keys[has_id] = pd.util.hash_array(ids, hash_key=CRIME_ID_HASH_KEY)
+    if not has_id.all():
+        columns = [column for column in df.columns if column not in ignore_columns]
+        rows = df.loc[~has_id, columns]
+        keys[~has_id] = pd.util.hash_pandas_object(rows, index=False, hash_key=ROW_HASH_KEY).to_numpy()
+    return keys
+
+class KeySet:
+    """
+    Set of uint64 keys stored as a few sorted numpy runs, 8 bytes per key.
+
+    Runs are merged whenever the newest run grows to half the size of the one
+    before it, so there are only O(log n) runs to binary search.
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, keys):
+        """
+        Boolean mask of the keys already in the set.
+        """
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, keys), len(run) - 1)
+            found |= run[positions] == keys
+        return found
+
+    def add(self, keys):
+        """
+        Add keys to the set.
+        """
+        keys = np.unique(np.asarray(keys, dtype=np.uint64))
+        if len(keys) == 0:
+            return
+        self.runs.append(keys)
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            newest = self.runs.pop()
+            self.runs[-1] = np.union1d(self.runs[-1], newest)
+
+    def update(self, other):
+        """
+        Add every key of another KeySet.
+        """
+        for run in other.runs:
+            self.add(run)
+
+def new_rows_mask(keys, *key_sets):
+    """
+    Boolean mask of the first occurrence of every key not found in any of key_sets.
+    """
+    first = np.zeros(len(keys), dtype=bool)
+    first[np.unique(keys, return_index=True)[1]] = True
+    for key_set in key_sets:
+        first &= ~key_set.contains(keys)
+    return first
@@ -0,0 +1,238 @@
+# density.py
+
+import logging
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Zoom levels of the grid pyramid, and grid cells per 256px map tile at each level
+PYRAMID_ZOOMS = (6, 8, 10)
+CELLS_PER_TILE = 64
+
+# Finest grid zoom. Its cells hold about one point each, so instead of a pyramid
+# level the raw points in the viewport are binned on request
+POINT_ZOOM = 12
+GRID_ZOOMS = PYRAMID_ZOOMS + (POINT_ZOOM,)
+
+# Upper bound on the number of cells sent to the browser for one heatmap
+MAX_HEATMAP_CELLS = 20000
+
+# Grids of up to this many cells are binned with a dense count array
+DENSE_GRID_CELLS = 1 << 22
+
+# Counts of crimes per (grid cell, crime type code, outcome type code) at one zoom level.
+# Cells are numbered row-major from the grid origin (lat0, lon0), and the
+# entries are sorted by cell so each grid row is a contiguous run.
+DensityLevel = namedtuple('DensityLevel', [
+    'zoom', 'cell_size', 'lat0', 'lon0', 'n_lat', 'n_lon', 'cells', 'crime_codes', 'outcome_codes', 'counts'
+])
+DensityPyramid = namedtuple('DensityPyramid', ['levels', 'crime_types', 'outcome_types'])
+
+# Array fields of a DensityLevel, stored per level in the data snapshot
+LEVEL_ARRAYS = ['cells', 'crime_codes', 'outcome_codes', 'counts']
+
+def cell_size(zoom):
+    """
+    Grid cell size in degrees at a pyramid zoom level.
+    """
+    return 360.0 / 2 ** zoom / CELLS_PER_TILE
+
+def level_zoom_for(zoom):
+    """
+    Finest grid zoom whose cells are still at least two pixels wide at the map zoom.
+    """
+    candidates = [level for level in GRID_ZOOMS if level <= zoom + 1]
+    return candidates[-1] if candidates else GRID_ZOOMS[0]
+
+def _build_level(zoom, lat, lon, crime_codes, outcome_codes, n_crimes, n_outcomes):
+    """
+    Bin points into the grid of one zoom level and count them per cell and category pair.
+    """
+    size = cell_size(zoom)
+    lat0 = np.floor(lat.min() / size) * size
+    lon0 = np.floor(lon.min() / size) * size
+    lat_bins = ((lat - lat0) / size).astype(np.int64)
+    lon_bins = ((lon - lon0) / size).astype(np.int64)
+    n_lat, n_lon = int(lat_bins.max()) + 1, int(lon_bins.max()) + 1
+
+    keys = ((lat_bins * n_lon + lon_bins) * n_crimes + crime_codes) * n_outcomes + outcome_codes
+    keys, counts = np.unique(keys, return_counts=True)
+    rest, outcomes = np.divmod(keys, n_outcomes)
+    cells, crimes = np.divmod(rest, n_crimes)
+
+    # 32-bit cell numbers halve the largest array whenever they fit
+    if n_lat * n_lon < 2 ** 31:
+        cells = cells.astype(np.int32)
+    return DensityLevel(
+        zoom, size, float(lat0), float(lon0), n_lat, n_lon,
+        cells, crimes.astype(np.int16), outcomes.astype(np.int16), counts.astype(np.int32)
+    )
+
+def build_pyramid(df, zooms=PYRAMID_ZOOMS):
+    """
+    Build the multi-resolution density grid pyramid from the compact crime data.
+    """
+    if df.empty:
+        return DensityPyramid([], [], [])
+
+    crime_codes = df['crime_type'].cat.codes.to_numpy().astype(np.int64)
+    outcome_codes = df['outcome_type'].cat.codes.to_numpy().astype(np.int64)
+    lat = df['latitude'].to_numpy(dtype=np.float64)
+    lon = df['longitude'].to_numpy(dtype=np.float64)
+    keep = (crime_codes >= 0) & (outcome_codes >= 0) & np.isfinite(lat) & np.isfinite(lon)
+    if not keep.any():
+        return DensityPyramid([], [], [])
+
+    crime_types = df['crime_type'].cat.categories.tolist()
+    outcome_types = df['outcome_type'].cat.categories.tolist()
+    levels = [
+        _build_level(zoom, lat[keep], lon[keep], crime_codes[keep], outcome_codes[keep],
+                     len(crime_types), len(outcome_types))
+        for zoom in zooms
+    ]
+    logging.info(f"Built density pyramid with {[len(level.cells) for level in levels]} entries per level.")
+    return DensityPyramid(levels, crime_types, outcome_types)
+
+def pyramid_arrays(pyramid):
+    """
+    Split a pyramid into named arrays and JSON metadata for the data snapshot.
+    """
+    arrays = {}
+    levels = []
+    for level in pyramid.levels:
+        for field in LEVEL_ARRAYS:
+            arrays[f'{level.zoom}_{field}'] = getattr(level, field)
+        levels.append({field: getattr(level, field) for field in DensityLevel._fields if field not in LEVEL_ARRAYS})
+    info = {'levels': levels, 'crime_types': pyramid.crime_types, 'outcome_types': pyramid.outcome_types}
+    return arrays, info
+
+def pyramid_from_arrays(arrays, info):
+    """
+    Rebuild a pyramid from the arrays and metadata of pyramid_arrays, without copying the arrays.
+    """
+    levels = [
+        DensityLevel(**level, **{field: arrays[f"{level['zoom']}_{field}"] for field in LEVEL_ARRAYS})
+        for level in info['levels']
+    ]
+    return DensityPyramid(levels, info['crime_types'], info['outcome_types'])
+
+def _cells_frame(lat_bins, lon_bins, counts, size):
+    """
+    Turn grid cells numbered from the origin into latitude/longitude/density_val rows.
+    """
+    # Cell centres rounded to ~10cm keep the serialised figure small
+    return pd.DataFrame({
+        'latitude': np.round((lat_bins + 0.5) * size, 6),
+        'longitude': np.round((lon_bins + 0.5) * size, 6),
+        'density_val': counts.astype(np.int64)
+    })
+
+def _grid(lat_bins, lon_bins, weights=None):
+    """
+    Sum weights, or count points, per (lat_bin, lon_bin) grid cell.
+    """
+    if len(lat_bins) == 0:
+        return lat_bins, lon_bins, np.zeros(0, dtype=np.int64)
+    lat_first, lon_first = lat_bins.min(), lon_bins.min()
+    n_lat, n_lon = int(lat_bins.max() - lat_first) + 1, int(lon_bins.max() - lon_first) + 1
+    keys = (lat_bins - lat_first) * n_lon + (lon_bins - lon_first)
+    if n_lat * n_lon <= DENSE_GRID_CELLS:
+        # Small grids are counted directly, without sorting the keys
+        counts = np.bincount(keys, weights=weights, minlength=n_lat * n_lon)
+        cells = np.flatnonzero(counts)
+        counts = counts[cells]
+    else:
+        cells, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights, minlength=len(cells))
+    cell_lat, cell_lon = np.divmod(cells, n_lon)
+    return cell_lat + lat_first, cell_lon + lon_first, counts
+
+def _viewport_entries(level, bounds):
+    """
+    Get the positions of a level's entries whose cells overlap bounds.
+
+    Like spatial_index.query_bbox, each grid row of the box is one contiguous
+    run of the cell-sorted entries, found with a binary search.
+    """
+    first_lat = max(int((bounds.min_lat - level.lat0) // level.cell_size), 0)
+    last_lat = min(int((bounds.max_lat - level.lat0) // level.cell_size), level.n_lat - 1)
+    first_lon = max(int((bounds.min_lon - level.lon0) // level.cell_size), 0)
+    last_lon = min(int((bounds.max_lon - level.lon0) // level.cell_size), level.n_lon - 1)
+    if first_lat > last_lat or first_lon > last_lon:
+        return np.empty(0, dtype=np.int64)
+
+    lat_rows = np.arange(first_lat, last_lat + 1, dtype=np.int64) * level.n_lon
+    starts = np.searchsorted(level.cells, lat_rows + first_lon, side='left')
+    ends = np.searchsorted(level.cells, lat_rows + last_lon, side='right')
+    lengths = ends - starts
+    return np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(starts, lengths)
+
+def _level_cells(level, crime_ok, outcome_ok, bounds):
+    """
+    Sum the counts of the selected categories per grid cell of one level inside bounds.
+
+    Returns the cells' global lat/lon bins and their counts.
+    """
+    cells, crime_codes, outcome_codes, counts = level.cells, level.crime_codes, level.outcome_codes, level.counts
+    if bounds is not None:
+        entries = _viewport_entries(level, bounds)
+        cells, crime_codes, outcome_codes, counts = cells[entries], crime_codes[entries], outcome_codes[entries], counts[entries]
+    selected = crime_ok[crime_codes] & outcome_ok[outcome_codes]
+    lat_bins, lon_bins = np.divmod(cells[selected].astype(np.int64), level.n_lon)
+    return _grid(
+        lat_bins + int(round(level.lat0 / level.cell_size)),
+        lon_bins + int(round(level.lon0 / level.cell_size)),
+        counts[selected]
+    )
+
+def select_cells(pyramid, level_zoom, selected_outcomes, selected_crimes, bounds=None):
+    """
+    Get the selection's density cells inside bounds, as latitude/longitude/density_val rows.
+
+    Starts at the pyramid level for level_zoom (the coarsest one below it for
+    POINT_ZOOM), stepping to coarser levels until at most MAX_HEATMAP_CELLS cells
+    are in view. Returns the cells and the level zoom used.
+    """
+    if not pyramid.levels:
+        return pd.DataFrame(columns=['latitude', 'longitude', 'density_val']), PYRAMID_ZOOMS[0]
+
+    crime_ok = np.isin(np.asarray(pyramid.crime_types, dtype=object), list(selected_crimes or []))
+    outcome_ok = np.isin(np.asarray(pyramid.outcome_types, dtype=object), list(selected_outcomes or []))
+
+    candidates = [level for level in pyramid.levels if level.zoom <= level_zoom] or pyramid.levels[:1]
+    for level in reversed(candidates):
+        lat_bins, lon_bins, counts = _level_cells(level, crime_ok, outcome_ok, bounds)
+        if len(counts) <= MAX_HEATMAP_CELLS:
+            break
+    return _cells_frame(lat_bins, lon_bins, counts, level.cell_size), level.zoom
+
+def select_points(lat, lon, level_zoom):
+    """
+    Bin raw points at level_zoom, as latitude/longitude/density_val rows.
+
+    Steps to coarser grid zooms until at most MAX_HEATMAP_CELLS cells remain,
+    merging the finer cells rather than rebinning the points. Returns the cells
+    and the grid zoom used.
+    """
+    zooms = [zoom for zoom in GRID_ZOOMS if zoom <= level_zoom] or list(GRID_ZOOMS[:1])
+    zoom = zooms[-1]
+    size = cell_size(zoom)
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    lat_bins, lon_bins, counts = _grid(np.floor(lat / size).astype(np.int64), np.floor(lon / size).astype(np.int64))
+    for coarser in reversed(zooms[:-1]):
+        if len(counts) <= MAX_HEATMAP_CELLS:
+            break
+        # Grids are aligned at the origin, so each coarser cell holds whole finer cells
+        factor = 2 ** (zoom - coarser)
+        lat_bins, lon_bins, counts = _grid(lat_bins // factor, lon_bins // factor, counts)
+        zoom = coarser
+    return _cells_frame(lat_bins, lon_bins, counts, cell_size(zoom)), zoom
+
+def cell_radius(zoom, level_zoom):
+    """
+    Heatmap point radius in pixels so neighbouring cells blend at the map zoom.
+    """
+    cell_pixels = 256 / CELLS_PER_TILE * 2 ** (zoom - level_zoom)
+    return int(min(max(cell_pixels * 1.5, 5), 50))
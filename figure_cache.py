@@ -0,0 +1,107 @@
+# figure_cache.py
+
+import logging
+import pickle
+import threading
+from collections import OrderedDict
+
+try:
+    import diskcache
+except ImportError:  # Only the in-process backend is available
+    diskcache = None
+
+def selection_key(selected_outcomes, selected_crimes):
+    """
+    Normalise a dropdown selection so the same choice in any order gives the same key.
+    """
+    return (tuple(sorted(set(selected_outcomes or []))), tuple(sorted(set(selected_crimes or []))))
+
+class FigureCache:
+    """
+    LRU cache of callback outputs, bounded by the total size of their pickled bytes.
+
+    With a directory, entries live in a diskcache.Cache shared by every worker
+    that points at it; otherwise each worker keeps its own OrderedDict.
+    Keys should include the data version so entries of older data never hit.
+    """
+
+    def __init__(self, max_bytes, directory=None):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.disk = None
+        if directory:
+            if diskcache is None:
+                logging.warning("diskcache is not installed, using a per-worker figure cache.")
+            else:
+                self.disk = diskcache.Cache(directory, size_limit=max_bytes, eviction_policy='least-recently-used')
+
+    def get(self, key):
+        """
+        Get the cached value for key, or None if it is not cached.
+        """
+        with self.lock:
+            if self.disk is not None:
+                payload = self.disk.get(key)
+            else:
+                payload = self.entries.get(key)
+                if payload is not None:
+                    self.entries.move_to_end(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return pickle.loads(payload)
+
+    def set(self, key, value):
+        """
+        Cache value under key, evicting the least recently used entries to stay within max_bytes.
+        """
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+        with self.lock:
+            if self.disk is not None:
+                self.disk.set(key, payload)
+                return
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = payload
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def get_or_compute(self, key, compute):
+        """
+        Get the cached value for key, computing and caching it on a miss.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        """
+        Drop every entry, e.g. after the data is reloaded.
+        """
+        with self.lock:
+            if self.disk is not None:
+                self.disk.clear()
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Hit/miss counters of this worker and the cache's current size.
+        """
+        with self.lock:
+            if self.disk is not None:
+                size, entries = self.disk.volume(), len(self.disk)
+            else:
+                size, entries = self.size, len(self.entries)
+            return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes}
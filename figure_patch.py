@@ -0,0 +1,38 @@
+# figure_patch.py
+
+import hashlib
+
+import dash
+import numpy as np
+
+def digest(values):
+    """
+    Short fingerprint of one trace property's values.
+    """
+    array = np.asarray(values)
+    if array.dtype.kind in 'OUSM':
+        payload = '\x1f'.join(map(str, array.ravel().tolist())).encode()
+    else:
+        payload = array.tobytes()
+    return hashlib.blake2b(payload + array.dtype.str.encode(), digest_size=8).hexdigest()
+
+def patch_figure(traces, digests):
+    """
+    Build a dash.Patch that updates only the trace properties whose values changed.
+
+    traces holds one {property: values} dict per trace of the figure, in trace
+    order; digests holds the fingerprints the browser's figure was last patched
+    with. Returns the Patch (or dash.no_update when nothing changed) and the new
+    fingerprints to keep in the figure's dcc.Store.
+    """
+    patch = dash.Patch()
+    new_digests = {}
+    for number, trace in enumerate(traces):
+        for prop, values in trace.items():
+            key = f"{number}.{prop}"
+            new_digests[key] = digest(values)
+            if (digests or {}).get(key) != new_digests[key]:
+                patch['data'][number][prop] = values
+    if new_digests == (digests or {}):
+        return dash.no_update, new_digests
+    return patch, new_digests
@@ -3,11 +3,20 @@
 import logging  # Import the logging module
 from dash import dcc, html
 import plotly.express as px
-from data_processing import get_yearly_comparison  # Import necessary functions
+import top_counts  # Import the ingest-time location and LSOA counters
+
+def statistics_layout(chart_data, column_counts):
+    """
+    Build the statistics page; the monthly and yearly charts come from chart_data
+    (the 'time_series' and 'yearly_comparison' aggregations of the count cube or
+    the database) and the location and LSOA rankings from column_counts, the
+    TopCounts kept at ingest keyed by column.
+    """
+    monthly_counts = chart_data['time_series']
+    yearly_comparison_data = chart_data['yearly_comparison']
 
-def statistics_layout(crime_data):
     # Check if data is available
-    if crime_data.empty:
+    if monthly_counts.empty and yearly_comparison_data.empty and not column_counts:
         return html.Div(
             "No data available.",
             style={
@@ -24,9 +33,9 @@ def statistics_layout(crime_data):
         # Initialize an empty list to hold statistical sections
         stats_sections = []
 
-        # Top Neighborhoods (Assuming 'Location' exists)
-        if 'Location' in crime_data.columns:
-            top_neighborhoods = crime_data['Location'].value_counts().head(10).reset_index()
+        # Top Neighborhoods (Assuming 'location' was counted at ingest)
+        if 'location' in column_counts:
+            top_neighborhoods = top_counts.get_top(column_counts['location'], 10)
             top_neighborhoods.columns = ['Neighborhood', 'Crime Count']
             neighborhood_graph = html.Div([
                 html.H2('10 Most Common Crime Locations'),
@@ -42,24 +51,22 @@ def statistics_layout(crime_data):
             ], className='graph-container')
             stats_sections.append(neighborhood_graph)
         else:
-            logging.warning("'Location' column not found in the dataset.")  # Use logging.warning
+            logging.warning("No 'location' counts found; reload the CSV files to count them.")  # Use logging.warning
 
         # Crime Type Distribution by LSOA
-        if 'LSOA name' in crime_data.columns and 'Crime type' in crime_data.columns:
-            lsoa_crime = crime_data.groupby(['LSOA name', 'Crime type']).size().reset_index(name='Count')
+        if 'lsoa_name' in column_counts:
             # To avoid clutter, focus on top 10 LSOAs by crime count
-            top_lsoas = crime_data['LSOA name'].value_counts().head(10).index
-            lsoa_crime_top = lsoa_crime[lsoa_crime['LSOA name'].isin(top_lsoas)]
+            lsoa_crime_top = top_counts.get_top_by_crime_type(column_counts['lsoa_name'], 10)
             lsoa_crime_graph = html.Div([
                 html.H2('Crime Distribution by LSOA'),
                 dcc.Graph(
                     figure=px.bar(
                         lsoa_crime_top,
-                        x='LSOA name',
+                        x='lsoa_name',
                         y='Count',
-                        color='Crime type',
+                        color='crime_type',
                         title='Crime Distribution across Top 10 LSOAs',
-                        labels={'Count': 'Number of Crimes', 'LSOA name': 'LSOA'},
+                        labels={'Count': 'Number of Crimes', 'lsoa_name': 'LSOA', 'crime_type': 'Crime type'},
                         template='plotly_dark',
                         barmode='stack'
                     )
@@ -67,32 +74,29 @@ def statistics_layout(crime_data):
             ], className='graph-container')
             stats_sections.append(lsoa_crime_graph)
         else:
-            logging.warning("'LSOA name' or 'Crime type' column not found in the dataset.")
+            logging.warning("No 'lsoa_name' counts found; reload the CSV files to count them.")
 
         # Monthly Crime Counts
-        if 'Month' in crime_data.columns:
-            monthly_counts = crime_data.groupby(crime_data['Month'].dt.to_period('M')).size().reset_index(name='Count')
-            monthly_counts['Month'] = monthly_counts['Month'].dt.to_timestamp()
+        if not monthly_counts.empty:
             monthly_graph = html.Div([
                 html.H2('Monthly Crime Counts'),
                 dcc.Graph(
                     figure=px.line(
                         monthly_counts,
-                        x='Month',
+                        x='month',
                         y='Count',
                         title='Monthly Crime Counts Over Time',
-                        labels={'Count': 'Number of Crimes', 'Month': 'Month'},
+                        labels={'Count': 'Number of Crimes', 'month': 'Month'},
                         template='plotly_dark'
                     )
                 )
             ], className='graph-container')
             stats_sections.append(monthly_graph)
         else:
-            logging.warning("'Month' column not found in the dataset.")
+            logging.warning("No dated records found for the monthly counts.")
 
         # Yearly Comparison of Crime Types
-        if 'Month' in crime_data.columns and 'Crime type' in crime_data.columns:
-            yearly_comparison_data = get_yearly_comparison(crime_data)
+        if not yearly_comparison_data.empty:
             yearly_comparison_graph = html.Div([
                 html.H2('Yearly Comparison of Crime Types'),
                 dcc.Graph(
@@ -100,17 +104,17 @@ def statistics_layout(crime_data):
                         yearly_comparison_data,
                         x='Year',
                         y='Count',
-                        color='Crime type',
+                        color='crime_type',
                         barmode='group',
                         title='Yearly Comparison of Crime Types',
-                        labels={'Count': 'Number of Crimes', 'Year': 'Year'},
+                        labels={'Count': 'Number of Crimes', 'Year': 'Year', 'crime_type': 'Crime type'},
                         template='plotly_dark'
                     )
                 )
             ], className='graph-container')
             stats_sections.append(yearly_comparison_graph)
         else:
-            logging.warning("'Month' or 'Crime type' column not found in the dataset.")
+            logging.warning("No dated records with a crime type found for the yearly comparison.")
 
         # If no additional statistics sections were added
         if not stats_sections:
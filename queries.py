@@ -0,0 +1,256 @@
+# queries.py
+
+import logging
+
+import pandas as pd
+from sqlalchemy import text
+
+import data_processing
+import top_counts
+
+# Dropdown and date range filters shared by every push-down query. A NULL
+# :first_month selects every month, including rows without one.
+SELECTION_FILTER = """
+    outcome_type = ANY(:outcomes) AND crime_type = ANY(:crimes)
+    AND (CAST(:first_month AS date) IS NULL OR (month >= :first_month AND month < :end_month))
+"""
+
+# Months spanned by the date range slider
+MONTH_BOUNDS_QUERY = text("""
+    SELECT date_trunc('month', MIN(month)) AS first_month, date_trunc('month', MAX(month)) AS last_month
+    FROM crime_records
+""")
+
+TIME_SERIES_QUERY = text(f"""
+    SELECT date_trunc('month', month) AS month, COUNT(*) AS "Count"
+    FROM crime_records
+    WHERE {SELECTION_FILTER} AND month IS NOT NULL
+    GROUP BY 1
+    ORDER BY 1
+""")
+
+OUTCOME_COUNTS_QUERY = text(f"""
+    SELECT outcome_type, COUNT(*) AS "Count"
+    FROM crime_records
+    WHERE {SELECTION_FILTER}
+    GROUP BY outcome_type
+    ORDER BY 2 DESC, outcome_type
+""")
+
+CRIME_TYPE_COUNTS_QUERY = text(f"""
+    SELECT crime_type, COUNT(*) AS "Count"
+    FROM crime_records
+    WHERE {SELECTION_FILTER}
+    GROUP BY crime_type
+    ORDER BY 2 DESC, crime_type
+""")
+
+YEARLY_COMPARISON_QUERY = text(f"""
+    SELECT EXTRACT(YEAR FROM month)::int AS "Year", crime_type, COUNT(*) AS "Count"
+    FROM crime_records
+    WHERE {SELECTION_FILTER} AND month IS NOT NULL
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+""")
+
+SUMMARY_QUERY = text(f"""
+    SELECT COUNT(*) AS total,
+           mode() WITHIN GROUP (ORDER BY crime_type) AS most_common_crime_type,
+           mode() WITHIN GROUP (ORDER BY outcome_type) AS most_common_outcome_type,
+           date_trunc('month', MIN(month)) AS first_month,
+           date_trunc('month', MAX(month)) AS last_month
+    FROM crime_records
+    WHERE {SELECTION_FILTER}
+""")
+
+# Changes whenever rows are added, removed or a later month is loaded
+FRESHNESS_QUERY = text("""
+    SELECT COUNT(*) AS row_count, to_char(MAX(month), 'YYYY-MM') AS max_month
+    FROM crime_records
+""")
+
+# Visible map area of the scatter map point queries
+BOUNDS_FILTER = "latitude BETWEEN :min_lat AND :max_lat AND longitude BETWEEN :min_lon AND :max_lon"
+
+VIEWPORT_COUNT_QUERY = text(f"""
+    SELECT COUNT(*)
+    FROM crime_records
+    WHERE {SELECTION_FILTER} AND {BOUNDS_FILTER}
+""")
+
+# BERNOULLI sampling keeps the point query from reading every matching row.
+# REPEATABLE makes the same request return the same sample.
+POINTS_QUERY = text(f"""
+    SELECT latitude, longitude, crime_type, outcome_type
+    FROM crime_records TABLESAMPLE BERNOULLI (:percent) REPEATABLE (:seed)
+    WHERE {SELECTION_FILTER} AND {BOUNDS_FILTER}
+    LIMIT :limit
+""")
+
+# Keeps the densest cells when the grid has more than :max_cells of them
+DENSITY_GRID_QUERY = text(f"""
+    SELECT (FLOOR(latitude / :cell_size) + 0.5) * :cell_size AS latitude,
+           (FLOOR(longitude / :cell_size) + 0.5) * :cell_size AS longitude,
+           COUNT(*) AS density_val
+    FROM crime_records
+    WHERE {SELECTION_FILTER} AND latitude IS NOT NULL AND longitude IS NOT NULL
+    GROUP BY 1, 2
+    ORDER BY 3 DESC
+    LIMIT :max_cells
+""")
+
+# Full scan behind the approximate mode's sample and crime_id sketches
+APPROX_SOURCE_QUERY = text("""
+    SELECT month, crime_type, outcome_type, crime_id
+    FROM crime_records
+""")
+
+# Changes whenever the loader ingests or removes a file
+INGEST_VERSION_QUERY = text("""
+    SELECT COUNT(*) AS files, MAX(ingested_at) AS ingested_at
+    FROM ingest_manifest
+""")
+
+# Ingest-time counters kept by load_csv_to_db, summed over the source files
+TOP_COUNTS_QUERY = text("""
+    SELECT column_name, value, crime_type, SUM(count) AS count
+    FROM top_counts
+    GROUP BY 1, 2, 3
+""")
+
+def _selection_params(selected_outcomes, selected_crimes, month_range=None):
+    """
+    Bind parameters for the dropdown filters and the (first, last) month ordinals of the date range.
+    """
+    params = {'outcomes': list(selected_outcomes or []), 'crimes': list(selected_crimes or []),
+              'first_month': None, 'end_month': None}
+    if month_range is not None:
+        first_month, end_month = data_processing.ordinal_to_month([month_range[0], month_range[1] + 1])
+        params['first_month'] = first_month.date()
+        params['end_month'] = end_month.date()
+    return params
+
+def get_categories(engine, column):
+    """
+    Get the sorted distinct values of a category column for the dropdowns.
+    """
+    if column not in ('crime_type', 'outcome_type'):
+        raise ValueError(f"Unsupported category column: {column}")
+    query = text(f"SELECT DISTINCT {column} FROM crime_records WHERE {column} IS NOT NULL ORDER BY 1")
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(query)]
+
+def get_freshness_token(engine):
+    """
+    Get a token identifying the current contents of crime_records (row count and latest month).
+    """
+    with engine.connect() as conn:
+        row = conn.execute(FRESHNESS_QUERY).mappings().one()
+    return f"{row['row_count']}-{row['max_month']}"
+
+def get_ingest_version(engine):
+    """
+    Get a token identifying the files loaded into crime_records, from the ingest manifest.
+    """
+    with engine.connect() as conn:
+        row = conn.execute(INGEST_VERSION_QUERY).mappings().one()
+    return f"{row['files']}-{row['ingested_at']}"
+
+def get_month_bounds(engine):
+    """
+    Get the first and last month ordinals in crime_records, or None if no month is known.
+    """
+    with engine.connect() as conn:
+        row = conn.execute(MONTH_BOUNDS_QUERY).mappings().one()
+    if row['first_month'] is None:
+        return None
+    return tuple(int(m) for m in data_processing.month_to_ordinal(pd.Series([row['first_month'], row['last_month']])))
+
+def get_top_counts(engine):
+    """
+    Get the TopCounts of each column counted at ingest, keyed by column name.
+    """
+    with engine.connect() as conn:
+        rows = pd.read_sql(TOP_COUNTS_QUERY, conn)
+    return {
+        column: top_counts.build_top_counts(column, column_rows)
+        for column, column_rows in rows.groupby('column_name')
+    }
+
+def read_approx_source(conn, chunksize=200000):
+    """
+    Stream the columns the approximate mode is built from, chunksize rows at a time.
+    """
+    stream = conn.execution_options(stream_results=True)
+    yield from pd.read_sql(APPROX_SOURCE_QUERY, stream, chunksize=chunksize, parse_dates=['month'])
+
+def get_chart_data(engine, selected_outcomes, selected_crimes, month_range=None):
+    """
+    Run the aggregations behind the time series, bar charts and yearly comparison.
+    """
+    params = _selection_params(selected_outcomes, selected_crimes, month_range)
+    with engine.connect() as conn:
+        chart_data = {
+            'time_series': pd.read_sql(TIME_SERIES_QUERY, conn, params=params, parse_dates=['month']),
+            'outcome_counts': pd.read_sql(OUTCOME_COUNTS_QUERY, conn, params=params),
+            'crime_type_counts': pd.read_sql(CRIME_TYPE_COUNTS_QUERY, conn, params=params),
+            'yearly_comparison': pd.read_sql(YEARLY_COMPARISON_QUERY, conn, params=params),
+        }
+    logging.info(f"Pushed down chart aggregations for {len(params['outcomes'])} outcome and {len(params['crimes'])} crime types.")
+    return chart_data
+
+def get_statistics_data(engine):
+    """
+    Run the monthly series and yearly comparison of every record for the statistics page.
+    """
+    params = _selection_params(get_categories(engine, 'outcome_type'), get_categories(engine, 'crime_type'))
+    with engine.connect() as conn:
+        return {
+            'time_series': pd.read_sql(TIME_SERIES_QUERY, conn, params=params, parse_dates=['month']),
+            'yearly_comparison': pd.read_sql(YEARLY_COMPARISON_QUERY, conn, params=params),
+        }
+
+def get_summary_statistics(engine, selected_outcomes, selected_crimes, month_range=None):
+    """
+    Get the total count, most common crime and outcome types and the months covered.
+    """
+    with engine.connect() as conn:
+        row = conn.execute(SUMMARY_QUERY, _selection_params(selected_outcomes, selected_crimes, month_range)).mappings().one()
+    summary = dict(row)
+    summary['first_month'] = pd.Timestamp(summary['first_month']) if summary['first_month'] else None
+    summary['last_month'] = pd.Timestamp(summary['last_month']) if summary['last_month'] else None
+    return summary
+
+def _bounds_params(bounds):
+    """
+    Bind parameters for the visible map area, or the whole world when bounds is None.
+    """
+    if bounds is None:
+        return {'min_lat': -90.0, 'max_lat': 90.0, 'min_lon': -180.0, 'max_lon': 180.0}
+    return {'min_lat': bounds.min_lat, 'max_lat': bounds.max_lat, 'min_lon': bounds.min_lon, 'max_lon': bounds.max_lon}
+
+def get_points(engine, selected_outcomes, selected_crimes, limit, bounds, seed, month_range=None):
+    """
+    Get up to limit sampled points of the selection inside bounds for the scatter map.
+
+    The same seed, selection and bounds give the same sample.
+    """
+    params = _selection_params(selected_outcomes, selected_crimes, month_range)
+    params.update(_bounds_params(bounds))
+    with engine.connect() as conn:
+        selected_total = conn.execute(VIEWPORT_COUNT_QUERY, params).scalar()
+        # Sample enough of the table that a few more than `limit` selected rows survive the filter
+        params['percent'] = min(100.0, 100.0 * 1.2 * limit / max(selected_total, 1))
+        params['limit'] = limit
+        params['seed'] = seed
+        return pd.read_sql(POINTS_QUERY, conn, params=params)
+
+def get_density_grid(engine, selected_outcomes, selected_crimes, cell_size, max_cells, month_range=None):
+    """
+    Get the selection binned into a lat/lon grid with counts in 'density_val'.
+    """
+    params = _selection_params(selected_outcomes, selected_crimes, month_range)
+    params['cell_size'] = cell_size
+    params['max_cells'] = max_cells
+    with engine.connect() as conn:
+        return pd.read_sql(DENSITY_GRID_QUERY, conn, params=params)
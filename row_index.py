@@ -0,0 +1,69 @@
+# row_index.py
+
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+# Packed row bitmaps (one bit per row) for every crime type and outcome type.
+# complete is True when every row has both a crime and an outcome type, so
+# selecting every category selects every row.
+RowIndex = namedtuple('RowIndex', ['n_rows', 'crime_bitmaps', 'outcome_bitmaps', 'complete'])
+
+def _category_bitmaps(column):
+    """
+    Build one packed row bitmap per category of a categorical column.
+    """
+    codes = column.cat.codes.to_numpy()
+    return {
+        category: np.packbits(codes == code)
+        for code, category in enumerate(column.cat.categories)
+    }
+
+def build_row_index(df):
+    """
+    Build the per-category row bitmaps used to resolve dropdown selections.
+    """
+    if df.empty:
+        return RowIndex(0, {}, {}, True)
+
+    complete = bool(df['crime_type'].notna().all() and df['outcome_type'].notna().all())
+    index = RowIndex(
+        len(df),
+        _category_bitmaps(df['crime_type']),
+        _category_bitmaps(df['outcome_type']),
+        complete
+    )
+    logging.info(
+        f"Built row index with {len(index.crime_bitmaps)} crime type and "
+        f"{len(index.outcome_bitmaps)} outcome type bitmaps."
+    )
+    return index
+
+def _union(index, bitmaps, selected):
+    """
+    OR together the bitmaps of the selected categories.
+    """
+    union = np.zeros((index.n_rows + 7) // 8, dtype=np.uint8)
+    for category in set(selected or []):
+        if category in bitmaps:
+            union |= bitmaps[category]
+    return union
+
+def select_rows(index, selected_outcomes, selected_crimes):
+    """
+    Resolve a dropdown selection to a boolean row mask.
+
+    Returns None when the selection covers every row, so callers can skip
+    filtering entirely.
+    """
+    selected_outcomes = set(selected_outcomes or [])
+    selected_crimes = set(selected_crimes or [])
+    if (index.complete
+            and selected_outcomes.issuperset(index.outcome_bitmaps)
+            and selected_crimes.issuperset(index.crime_bitmaps)):
+        return None
+
+    bits = (_union(index, index.outcome_bitmaps, selected_outcomes)
+            & _union(index, index.crime_bitmaps, selected_crimes))
+    return np.unpackbits(bits, count=index.n_rows).view(bool)
@@ -0,0 +1,72 @@
+# sampling.py
+
+import numpy as np
+
+# Fixed seed so the same selection and viewport always gives the same sample
+SAMPLE_SEED = 20240731
+
+# The visible area is split into STRATA_GRID x STRATA_GRID cells, and every
+# (cell, crime type) pair is one stratum of the sample
+STRATA_GRID = 16
+
+def row_priorities(n_rows, seed=SAMPLE_SEED):
+    """
+    Draw a fixed random priority per row. Samples keep the lowest priorities.
+
+    The draws are sequential, so rows appended later keep the priorities of the
+    rows before them.
+    """
+    return np.random.default_rng(seed).random(n_rows, dtype=np.float32)
+
+def stratum_caps(sizes, budget):
+    """
+    Split budget across strata of the given sizes by water-filling.
+
+    Every stratum gets the same cap, except that strata smaller than the cap
+    keep all of their rows and leave the rest of their share to the others.
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    if sizes.sum() <= budget:
+        return sizes
+
+    # Cap if the k smallest strata are taken whole and the rest share what is left
+    sorted_sizes = np.sort(sizes)
+    taken = np.concatenate(([0], np.cumsum(sorted_sizes)[:-1]))
+    caps = (budget - taken) // (len(sizes) - np.arange(len(sizes)))
+    cap = caps[np.argmax(caps < sorted_sizes)]
+    capped = np.minimum(sizes, cap)
+
+    # Hand the rows left over by the integer division to the first larger strata
+    spare = np.flatnonzero(sizes > cap)[:budget - capped.sum()]
+    capped[spare] += 1
+    return capped
+
+def viewport_strata(lat, lon, bounds, crime_codes, n_crimes):
+    """
+    Number the (viewport grid cell, crime type) stratum of every point.
+    """
+    lat_step = max((bounds.max_lat - bounds.min_lat) / STRATA_GRID, 1e-12)
+    lon_step = max((bounds.max_lon - bounds.min_lon) / STRATA_GRID, 1e-12)
+    lat_cells = np.clip(((lat - bounds.min_lat) / lat_step).astype(np.int64), 0, STRATA_GRID - 1)
+    lon_cells = np.clip(((lon - bounds.min_lon) / lon_step).astype(np.int64), 0, STRATA_GRID - 1)
+    return (lat_cells * STRATA_GRID + lon_cells) * (n_crimes + 1) + (crime_codes.astype(np.int64) + 1)
+
+def stratified_sample(rows, strata, priorities, budget):
+    """
+    Keep up to budget of rows, split evenly across their strata.
+
+    Within each stratum the rows with the lowest priorities are kept, so the
+    result only depends on the rows, strata and priorities. Returns row numbers
+    in ascending order.
+    """
+    if len(rows) <= budget:
+        return rows
+
+    order = np.lexsort((priorities[rows], strata))
+    rows, strata = rows[order], strata[order]
+    _, starts, sizes = np.unique(strata, return_index=True, return_counts=True)
+    caps = stratum_caps(sizes, budget)
+
+    # Position of every row within its stratum, in priority order
+    ranks = np.arange(len(rows)) - np.repeat(starts, sizes)
+    return np.sort(rows[ranks < np.repeat(caps, sizes)])
@@ -0,0 +1,204 @@
+# snapshot.py
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# A snapshot directory holds one sub-directory per written version, each with a
+# .npy file per column and a metadata.json describing the columns. Structures
+# derived from the data (extras) are stored alongside as named groups of arrays.
+# CURRENT names the version workers should map and is replaced atomically on every write.
+# Arrays keyed by a version of their own (see ensure_arrays) live under ARRAYS_DIR.
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = '.lock'
+METADATA_FILE = 'metadata.json'
+ARRAYS_DIR = 'arrays'
+
+def write_snapshot(df, directory, version=None, extras=None):
+    """
+    Write the compact crime data to a new snapshot version and make it current.
+
+    extras maps a name to an (arrays, info) pair: a dict of numpy arrays and
+    JSON-serialisable metadata, read back with load_extra.
+    """
+    version = version or f"{int(time.time() * 1000)}-{os.getpid()}"
+    version_dir = os.path.join(directory, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    metadata = {'version': version, 'rows': len(df), 'owner': os.getppid(), 'columns': {}}
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(version_dir, f'{column}.npy'), values.cat.codes.to_numpy())
+            metadata['columns'][column] = {'categories': values.cat.categories.tolist()}
+        else:
+            np.save(os.path.join(version_dir, f'{column}.npy'), values.to_numpy())
+            metadata['columns'][column] = {}
+
+    metadata['extras'] = {}
+    for name, (arrays, info) in (extras or {}).items():
+        for key, values in arrays.items():
+            np.save(os.path.join(version_dir, f'{name}.{key}.npy'), values)
+        metadata['extras'][name] = {'arrays': list(arrays), 'info': info}
+
+    with open(os.path.join(version_dir, METADATA_FILE), 'w') as f:
+        json.dump(metadata, f)
+
+    # Point CURRENT at the new version atomically
+    current_tmp = os.path.join(directory, f'{CURRENT_FILE}.{os.getpid()}')
+    with open(current_tmp, 'w') as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(directory, CURRENT_FILE))
+    logging.info(f"Wrote data snapshot {version} with {len(df)} records to {directory}.")
+
+    _remove_old_versions(directory, version)
+    return version
+
+def _remove_old_versions(directory, current_version):
+    """
+    Delete superseded snapshot versions. Workers still mapping them keep their pages.
+    """
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry not in (current_version, ARRAYS_DIR) and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+def current_version(directory):
+    """
+    Get the current snapshot version, or None if no snapshot has been written.
+    """
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def read_metadata(directory, version=None):
+    """
+    Read the metadata of a snapshot version (the current one by default).
+    """
+    version = version or current_version(directory)
+    with open(os.path.join(directory, version, METADATA_FILE)) as f:
+        return json.load(f)
+
+def load_snapshot(directory, version=None):
+    """
+    Map a snapshot version read-only into a DataFrame without copying the columns.
+    """
+    metadata = read_metadata(directory, version)
+    version_dir = os.path.join(directory, metadata['version'])
+
+    columns = {}
+    for column, info in metadata['columns'].items():
+        values = np.load(os.path.join(version_dir, f'{column}.npy'), mmap_mode='r')
+        if 'categories' in info:
+            values = pd.Categorical.from_codes(values, categories=info['categories'])
+        columns[column] = pd.Series(values, copy=False)
+
+    data = pd.DataFrame(columns, copy=False)
+    data.attrs['snapshot_version'] = metadata['version']
+    logging.info(f"Mapped data snapshot {metadata['version']} with {len(data)} records.")
+    return data
+
+def load_extra(directory, version, name):
+    """
+    Map the arrays of a snapshot version's extra read-only, returning (arrays, info) or None.
+    """
+    metadata = read_metadata(directory, version)
+    extra = metadata.get('extras', {}).get(name)
+    if extra is None:
+        return None
+    version_dir = os.path.join(directory, metadata['version'])
+    arrays = {key: np.load(os.path.join(version_dir, f'{name}.{key}.npy'), mmap_mode='r') for key in extra['arrays']}
+    return arrays, extra['info']
+
+def ensure_arrays(directory, name, version, build):
+    """
+    Map the arrays stored under name for a version, building and writing them first if needed.
+
+    build() returns an (arrays, info) pair of numpy arrays and JSON-serialisable
+    metadata; the pair is returned with the arrays mapped read-only. The first
+    worker to take the lock builds them and the others map what it wrote. Other
+    versions stored under name are deleted.
+    """
+    name_dir = os.path.join(directory, ARRAYS_DIR, name)
+    version_dir = os.path.join(name_dir, hashlib.sha256(version.encode()).hexdigest()[:16])
+    os.makedirs(name_dir, exist_ok=True)
+    with snapshot_lock(directory):
+        if not os.path.exists(os.path.join(version_dir, METADATA_FILE)):
+            arrays, info = build()
+            os.makedirs(version_dir, exist_ok=True)
+            for key, values in arrays.items():
+                np.save(os.path.join(version_dir, f'{key}.npy'), values)
+            with open(os.path.join(version_dir, METADATA_FILE), 'w') as f:
+                json.dump({'version': version, 'arrays': list(arrays), 'info': info}, f)
+            logging.info(f"Wrote {name} arrays for version {version} to {directory}.")
+            for entry in os.listdir(name_dir):
+                if os.path.join(name_dir, entry) != version_dir:
+                    shutil.rmtree(os.path.join(name_dir, entry), ignore_errors=True)
+
+        with open(os.path.join(version_dir, METADATA_FILE)) as f:
+            metadata = json.load(f)
+        arrays = {key: np.load(os.path.join(version_dir, f'{key}.npy'), mmap_mode='r') for key in metadata['arrays']}
+        return arrays, metadata['info']
+
+@contextmanager
+def snapshot_lock(directory):
+    """
+    Exclusive lock serialising snapshot writers across worker processes.
+    """
+    with open(os.path.join(directory, LOCK_FILE), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def ensure_snapshot(directory, loader, extras=None):
+    """
+    Map the current snapshot, loading the data with loader() and writing it first if needed.
+
+    extras(data), if given, returns the extras written with the data.
+
+    The first worker to take the lock pulls the data from the database; the
+    others wait for it and map the snapshot it wrote. A snapshot written under a
+    different gunicorn master is considered stale and is replaced.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with snapshot_lock(directory):
+        version = current_version(directory)
+        if version is None or read_metadata(directory, version)['owner'] != os.getppid():
+            data = loader()
+            if data.empty:
+                return data
+            write_snapshot(data, directory, extras=extras(data) if extras else None)
+        return load_snapshot(directory)
+
+def refresh_snapshot(directory, mapped_version, refresh, extras=None):
+    """
+    Map the newest snapshot, writing a refreshed one first if it is still mapped_version.
+
+    refresh(data) returns the refreshed data, or None when there is nothing new,
+    in which case None is returned. If another worker has already written a
+    newer snapshot it is mapped without touching the database. extras is as
+    for ensure_snapshot.
+    """
+    with snapshot_lock(directory):
+        version = current_version(directory)
+        if version is not None and version != mapped_version:
+            return load_snapshot(directory, version)
+
+        data = load_snapshot(directory, version) if version is not None else pd.DataFrame()
+        refreshed = refresh(data)
+        if refreshed is None:
+            return None
+        write_snapshot(refreshed, directory, extras=extras(refreshed) if extras else None)
+        return load_snapshot(directory)
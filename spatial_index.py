@@ -0,0 +1,155 @@
+# spatial_index.py
+
+import math
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Size in degrees of the grid cells rows are sorted by
+INDEX_CELL_SIZE = 0.01
+
+# Map size assumed when the browser has not reported the visible bounds yet
+DEFAULT_MAP_WIDTH_PX = 1280
+DEFAULT_MAP_HEIGHT_PX = 800
+
+# Visible map area in degrees
+Bounds = namedtuple('Bounds', ['min_lat', 'max_lat', 'min_lon', 'max_lon'])
+
+# Rows sorted by (lat cell, lon cell). order maps sorted positions back to row
+# numbers and keys holds the sorted cell key of every indexed row. bounds is the
+# extent of the indexed points, or None when there are none.
+SpatialIndex = namedtuple('SpatialIndex', ['cell_size', 'lat0', 'lon0', 'n_lat', 'n_lon', 'order', 'keys', 'lat', 'lon', 'bounds'])
+
+def build_index(lat, lon, cell_size=INDEX_CELL_SIZE):
+    """
+    Sort points into a row-major grid of cell_size cells for bounding box lookups.
+
+    Points with missing coordinates are left out of the index.
+    """
+    # Coordinates are kept in their stored dtype (float32 in the compact data)
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    rows = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    if len(rows) == 0:
+        return SpatialIndex(cell_size, 0.0, 0.0, 0, 0, rows, rows, lat, lon, None)
+
+    # Bin in float64 so the cells agree with the bounds arithmetic in query_bbox
+    lat_rows = lat[rows].astype(np.float64)
+    lon_rows = lon[rows].astype(np.float64)
+    bounds = Bounds(float(lat_rows.min()), float(lat_rows.max()), float(lon_rows.min()), float(lon_rows.max()))
+    lat0 = math.floor(lat_rows.min() / cell_size) * cell_size
+    lon0 = math.floor(lon_rows.min() / cell_size) * cell_size
+    lat_bins = ((lat_rows - lat0) / cell_size).astype(np.int64)
+    lon_bins = ((lon_rows - lon0) / cell_size).astype(np.int64)
+    n_lat, n_lon = int(lat_bins.max()) + 1, int(lon_bins.max()) + 1
+
+    keys = lat_bins * n_lon + lon_bins
+    sort = np.argsort(keys, kind='stable')
+
+    # 32-bit row numbers and keys halve the index size whenever they fit
+    order, keys = rows[sort], keys[sort]
+    if len(lat) < 2 ** 31:
+        order = order.astype(np.int32)
+    if n_lat * n_lon < 2 ** 31:
+        keys = keys.astype(np.int32)
+    return SpatialIndex(cell_size, lat0, lon0, n_lat, n_lon, order, keys, lat, lon, bounds)
+
+def query_bbox(index, bounds):
+    """
+    Get the row numbers of the indexed points inside bounds, in index order.
+
+    Each grid row overlapping the box is one contiguous key range, found with a
+    binary search; points in the partially covered edge cells are then checked exactly.
+    """
+    if index.n_lat == 0:
+        return np.empty(0, dtype=np.int64)
+
+    first_lat = max(int((bounds.min_lat - index.lat0) // index.cell_size), 0)
+    last_lat = min(int((bounds.max_lat - index.lat0) // index.cell_size), index.n_lat - 1)
+    first_lon = max(int((bounds.min_lon - index.lon0) // index.cell_size), 0)
+    last_lon = min(int((bounds.max_lon - index.lon0) // index.cell_size), index.n_lon - 1)
+    if first_lat > last_lat or first_lon > last_lon:
+        return np.empty(0, dtype=np.int64)
+
+    lat_rows = np.arange(first_lat, last_lat + 1) * index.n_lon
+    starts = np.searchsorted(index.keys, lat_rows + first_lon, side='left')
+    ends = np.searchsorted(index.keys, lat_rows + last_lon, side='right')
+
+    # Concatenate the [start, end) ranges without a Python loop
+    lengths = ends - starts
+    positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(starts, lengths)
+    rows = index.order[positions]
+
+    lat, lon = index.lat[rows], index.lon[rows]
+    inside = (lat >= bounds.min_lat) & (lat <= bounds.max_lat) & (lon >= bounds.min_lon) & (lon <= bounds.max_lon)
+    return rows[inside]
+
+def viewport_bounds(center, zoom, width_px=DEFAULT_MAP_WIDTH_PX, height_px=DEFAULT_MAP_HEIGHT_PX):
+    """
+    Compute the visible bounds of a Web Mercator map of the given pixel size.
+    """
+    world_px = 256 * 2 ** zoom
+    lon_span = 360.0 * width_px / world_px
+
+    # Mercator y in pixels grows southwards from the top of the world map
+    sin_lat = math.sin(math.radians(center['lat']))
+    center_y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * world_px
+
+    def y_to_lat(y):
+        n = math.pi - 2 * math.pi * y / world_px
+        return math.degrees(math.atan(math.sinh(n)))
+
+    return Bounds(
+        min_lat=y_to_lat(center_y + height_px / 2),
+        max_lat=y_to_lat(center_y - height_px / 2),
+        min_lon=center['lon'] - lon_span / 2,
+        max_lon=center['lon'] + lon_span / 2
+    )
+
+def bounds_from_relayout(relayout_data):
+    """
+    Get the exact visible bounds plotly reports in relayoutData, if present.
+    """
+    derived = (relayout_data or {}).get('mapbox._derived')
+    if not derived or 'coordinates' not in derived:
+        return None
+    lons = [corner[0] for corner in derived['coordinates']]
+    lats = [corner[1] for corner in derived['coordinates']]
+    return Bounds(min(lats), max(lats), min(lons), max(lons))
+
+def bin_counts(lat, lon, bounds, lat_bins, lon_bins):
+    """
+    Count points per cell of a lat_bins x lon_bins grid over bounds.
+
+    Returns the non-empty cells as latitude/longitude/count rows.
+    """
+    lat_step = (bounds.max_lat - bounds.min_lat) / lat_bins
+    lon_step = (bounds.max_lon - bounds.min_lon) / lon_bins
+    if len(lat) == 0 or lat_step <= 0 or lon_step <= 0:
+        return pd.DataFrame(columns=['latitude', 'longitude', 'count'])
+
+    lat_cells = np.clip(((lat - bounds.min_lat) / lat_step).astype(np.int64), 0, lat_bins - 1)
+    lon_cells = np.clip(((lon - bounds.min_lon) / lon_step).astype(np.int64), 0, lon_bins - 1)
+    counts = np.bincount(lat_cells * lon_bins + lon_cells, minlength=lat_bins * lon_bins)
+    cells = np.flatnonzero(counts)
+    cell_lat, cell_lon = np.divmod(cells, lon_bins)
+    return pd.DataFrame({
+        'latitude': np.round(bounds.min_lat + (cell_lat + 0.5) * lat_step, 6),
+        'longitude': np.round(bounds.min_lon + (cell_lon + 0.5) * lon_step, 6),
+        'count': counts[cells]
+    })
+
+def bucket_bounds(bounds, zoom):
+    """
+    Snap bounds outwards to a grid of quarter map tiles at the integer zoom.
+
+    Returns the bucket key and the snapped bounds, so nearby viewports at the
+    same zoom share one bucket and one result.
+    """
+    level = int(math.floor(zoom))
+    step = 360.0 / 2 ** level / 4
+    lat_first, lat_last = math.floor(bounds.min_lat / step), math.ceil(bounds.max_lat / step)
+    lon_first, lon_last = math.floor(bounds.min_lon / step), math.ceil(bounds.max_lon / step)
+    snapped = Bounds(lat_first * step, lat_last * step, lon_first * step, lon_last * step)
+    return (level, lat_first, lat_last, lon_first, lon_last), snapped
@@ -0,0 +1,54 @@
+# test_app.py
+
+import inspect
+import os
+
+import pandas as pd
+import pytest
+
+# Push-down mode starts no background data load when the app is imported
+os.environ.setdefault('DATA_MODE', 'pushdown')
+
+import app
+import data_processing
+
+def registered_callback(output):
+    """
+    Get the function a Dash callback was registered with, unwrapped from Dash's wrappers.
+    """
+    return inspect.unwrap(app.app.callback_map[output]['callback'])
+
+def test_heatmap_callback_is_update_heatmap():
+    assert registered_callback('crime-heatmap.figure') is app.update_heatmap
+
+def compact_frame(months):
+    return data_processing.compact_crime_data(pd.DataFrame({
+        'month': pd.to_datetime(months),
+        'crime_type': ['Burglary'] * len(months),
+        'outcome_type': ['Unknown'] * len(months),
+        'latitude': [51.5] * len(months),
+        'longitude': [-0.1] * len(months),
+    }))
+
+def test_refresh_reloads_rows_changed_within_loaded_months(monkeypatch):
+    monkeypatch.delenv('DATA_SNAPSHOT_DIR', raising=False)
+    monkeypatch.setattr(app, 'crime_dataset', app.dataset.build_dataset(compact_frame(['2024-01-01', '2024-02-01'])))
+    monkeypatch.setattr(app, 'data_token', 'loaded')
+    monkeypatch.setattr(app, 'read_freshness_token', lambda: 'changed')
+    monkeypatch.setattr(app, 'append_new_rows', lambda data: None)
+    monkeypatch.setattr(app, 'read_crime_records', lambda: compact_frame(['2024-02-01']))
+
+    refreshed = app.refresh_data()
+    assert len(refreshed.data) == 1
+    assert app.data_token == 'changed'
+
+def test_refresh_keeps_data_when_nothing_changed(monkeypatch):
+    monkeypatch.delenv('DATA_SNAPSHOT_DIR', raising=False)
+    current = app.dataset.build_dataset(compact_frame(['2024-01-01']))
+    monkeypatch.setattr(app, 'crime_dataset', current)
+    monkeypatch.setattr(app, 'data_token', 'loaded')
+    monkeypatch.setattr(app, 'read_freshness_token', lambda: 'loaded')
+    monkeypatch.setattr(app, 'append_new_rows', lambda data: None)
+    monkeypatch.setattr(app, 'read_crime_records', lambda: pytest.fail("reloaded unchanged data"))
+
+    assert app.refresh_data() is current
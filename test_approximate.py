@@ -0,0 +1,46 @@
+# test_approximate.py
+
+import numpy as np
+import pandas as pd
+
+import approximate
+
+def make_chunk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'month': pd.to_datetime('2023-01-01') + pd.to_timedelta(rng.integers(0, 6, n) * 31, unit='D'),
+        'crime_type': rng.choice(['Burglary', 'Drugs', 'Robbery'], n),
+        'outcome_type': rng.choice(['Unknown', 'Under investigation'], n),
+        'crime_id': [f'id{i}' for i in rng.integers(0, n // 2, n)],
+    })
+
+def test_hll_error_within_bounds():
+    ids = np.array([f'crime-{i}' for i in range(50000)], dtype=object)
+    registers, ranks = approximate.hash_registers(ids)
+    sketch = np.zeros(2 ** approximate.HLL_PRECISION, dtype=np.uint8)
+    np.maximum.at(sketch, registers, ranks)
+    relative_error = abs(approximate.hll_estimate(sketch) - len(ids)) / len(ids)
+    # Three standard errors of a 256-register sketch
+    assert relative_error < 3 * 1.04 / np.sqrt(len(sketch))
+
+def test_full_sample_estimates_exactly():
+    chunk = make_chunk(2000)
+    approx = approximate.build_index([chunk.iloc[:1000], chunk.iloc[1000:]], per_stratum=10000)
+    total, interval = approximate.estimate_total(approx, ['Unknown'], ['Burglary', 'Drugs'])
+    exact = (chunk['outcome_type'].eq('Unknown') & chunk['crime_type'].isin(['Burglary', 'Drugs'])).sum()
+    assert round(total) == exact
+    assert interval == 0
+
+def test_sampled_estimate_covers_the_exact_count():
+    chunk = make_chunk(60000, seed=2)
+    approx = approximate.build_index([chunk.iloc[i:i + 20000] for i in range(0, len(chunk), 20000)], per_stratum=200)
+    total, interval = approximate.estimate_total(approx, ['Unknown'], ['Burglary', 'Drugs', 'Robbery'])
+    exact = chunk['outcome_type'].eq('Unknown').sum()
+    assert abs(total - exact) <= interval
+    assert approx.sample_cube.counts.sum() <= 200 * approx.populations.size
+
+def test_index_arrays_round_trip():
+    approx = approximate.build_index([make_chunk(5000, seed=3)])
+    restored = approximate.index_from_arrays(*approximate.index_arrays(approx))
+    selection = (['Unknown', 'Under investigation'], ['Drugs'])
+    assert approximate.get_summary_statistics(approx, *selection) == approximate.get_summary_statistics(restored, *selection)
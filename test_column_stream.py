@@ -0,0 +1,98 @@
+# test_column_stream.py
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+import column_stream
+import data_processing
+
+COPY_OUTPUT = (
+    b'24288,Burglary,Unknown,51.5,-0.1\n'
+    b'24289,"Violence and sexual offences, other",Under investigation,51.6,-0.2\n'
+    b',Drugs,,,\n'
+    b'24290,,"Unable to prosecute suspect",51.7,-0.3\n'
+)
+
+def stream(data, write_size, batch_bytes):
+    builder = column_stream.ColumnBuilder(1)
+    sink = column_stream.CopySink(builder, batch_bytes=batch_bytes)
+    for start in range(0, len(data), write_size):
+        sink.write(data[start:start + write_size])
+    sink.flush()
+    return builder.to_frame()
+
+def test_quoted_and_null_fields():
+    frame = stream(COPY_OUTPUT, len(COPY_OUTPUT), 1 << 20)
+    assert frame['month'].tolist() == [24288, 24289, data_processing.MISSING_MONTH, 24290]
+    assert frame['crime_type'].astype(object).tolist()[:3] == ['Burglary', 'Violence and sexual offences, other', 'Drugs']
+    assert frame['crime_type'].isna().tolist() == [False, False, False, True]
+    assert frame['outcome_type'].isna().tolist() == [False, False, True, False]
+    assert np.isnan(frame['latitude'].iloc[2])
+
+def test_lines_split_across_buffers():
+    whole = stream(COPY_OUTPUT, len(COPY_OUTPUT), 1 << 20)
+    # Writes of a few bytes flushed every few bytes split lines and quoted fields across batches
+    for write_size, batch_bytes in [(1, 7), (5, 3), (13, 40)]:
+        split = stream(COPY_OUTPUT, write_size, batch_bytes)
+        assert split.equals(whole)
+
+def test_categories_are_sorted_like_compact_crime_data():
+    frame = stream(COPY_OUTPUT, len(COPY_OUTPUT), 1 << 20)
+    categories = frame['crime_type'].cat.categories.tolist()
+    assert categories == sorted(categories)
+
+class FakeCursor:
+    """
+    Stand-in for a psycopg2 cursor that answers COPY with fixed output.
+    """
+
+    def __init__(self, statements):
+        self.statements = statements
+
+    def copy_expert(self, sql, sink):
+        self.statements.append(sql)
+        sink.write(COPY_OUTPUT)
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    """
+    Stand-in for a SQLAlchemy connection to PostgreSQL through psycopg2.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.connection = self
+
+    def exec_driver_sql(self, sql):
+        self.statements.append(sql)
+        return self
+
+    def scalar(self):
+        return 4
+
+    def cursor(self):
+        return FakeCursor(self.statements)
+
+def test_read_crime_columns_after_month():
+    conn = FakeConnection()
+    frame = column_stream.read_crime_columns(conn, after_month=24287)
+    assert len(frame) == 4
+    # Rows of the watermark month itself are not read again
+    assert all("month >= '2024-01-01'::date" in sql for sql in conn.statements)
+    assert conn.statements[-1].startswith('COPY (') and 'ORDER BY month NULLS FIRST' in conn.statements[-1]
+
+def test_read_crime_frames_sorted_by_month(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/crime.db")
+    pd.DataFrame({
+        'month': pd.to_datetime(['2024-03-01', None, '2024-01-01', '2024-02-01']),
+        'crime_type': ['Burglary', 'Drugs', 'Burglary', 'Drugs'],
+        'outcome_type': ['Unknown'] * 4,
+        'latitude': [51.5] * 4,
+        'longitude': [-0.1] * 4,
+    }).to_sql('crime_records', engine, index=False)
+    with engine.connect() as conn:
+        frame = column_stream.read_crime_frames(conn, chunksize=2)
+    assert frame['month'].tolist() == [data_processing.MISSING_MONTH, 24288, 24289, 24290]
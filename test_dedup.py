@@ -0,0 +1,44 @@
+# test_dedup.py
+
+import numpy as np
+import pandas as pd
+
+import dedup
+
+def test_duplicate_ids_across_chunks_are_dropped():
+    seen = dedup.KeySet()
+    first = pd.DataFrame({'crime_id': ['a', 'b', 'b', None], 'crime_type': ['Burglary', 'Drugs', 'Drugs', 'Anti-social behaviour']})
+    keys = dedup.row_keys(first)
+    is_new = dedup.new_rows_mask(keys, seen)
+    assert is_new.tolist() == [True, True, False, True]
+    seen.add(keys[is_new])
+
+    # Same ids in a later chunk, plus an identical id-less row
+    second = pd.DataFrame({'crime_id': ['b', 'c', None], 'crime_type': ['Drugs', 'Robbery', 'Anti-social behaviour']})
+    assert dedup.new_rows_mask(dedup.row_keys(second), seen).tolist() == [False, True, False]
+
+def test_rows_without_id_are_keyed_by_their_values():
+    rows = pd.DataFrame({
+        'crime_id': [None, None, None],
+        'crime_type': ['Anti-social behaviour', 'Anti-social behaviour', 'Anti-social behaviour'],
+        'latitude': [51.5, 51.5, 51.6],
+        'source_file': ['a.csv', 'b.csv', 'a.csv'],
+    })
+    keys = dedup.row_keys(rows)
+    # source_file is ignored, so the same row from two files is one key
+    assert keys[0] == keys[1]
+    assert keys[0] != keys[2]
+
+def test_key_set_merges_runs():
+    key_set = dedup.KeySet()
+    rng = np.random.default_rng(0)
+    added = []
+    for _ in range(20):
+        keys = rng.integers(0, 2 ** 63, 100, dtype=np.uint64)
+        key_set.add(keys)
+        added.append(keys)
+    added = np.unique(np.concatenate(added))
+    assert len(key_set) == len(added)
+    assert len(key_set.runs) <= 2 * int(np.log2(len(added)))
+    assert key_set.contains(added).all()
+    assert not key_set.contains(np.array([1, 2, 3], dtype=np.uint64)).any()
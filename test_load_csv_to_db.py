@@ -0,0 +1,86 @@
+# test_load_csv_to_db.py
+
+import io
+import os
+import tempfile
+import warnings
+from types import SimpleNamespace
+
+import pandas as pd
+from sqlalchemy import create_engine, inspect
+
+# The loader creates its engine on import; point it at a throwaway database
+os.environ.setdefault('LOADER_DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/loader.db")
+
+import load_csv_to_db
+
+CSV = (
+    "Crime ID,Month,Reported by,Longitude,Latitude,Location,LSOA code,LSOA name,Crime type,Last outcome category\n"
+    "a1,2024-01,Force,-0.1,51.5,On or near High Street,E01,Camden 001A,Burglary,Under investigation\n"
+    ",2024-01,Force,-0.2,51.6,On or near Park Road,E02,Camden 002B,Anti-social behaviour,\n"
+    "a3,2024-02,Force,-0.3,51.7,\"On or near Mill Lane, North\",E03,Camden 003C,Drugs,Unknown\n"
+)
+
+def cleaned_frame(tmp_path):
+    path = tmp_path / 'street.csv'
+    path.write_text(CSV)
+    frame = pd.concat([load_csv_to_db.clean_data(chunk) for chunk in load_csv_to_db.read_csv_chunks(str(path))])
+    frame['source_file'] = 'street.csv'
+    return frame
+
+class FakeCursor:
+    """
+    Stand-in for a psycopg2 cursor that records what COPY FROM STDIN receives.
+    """
+
+    def __init__(self, copies):
+        self.copies = copies
+
+    def copy_expert(self, sql, buffer):
+        self.copies.append((sql, buffer.read()))
+
+    def close(self):
+        pass
+
+def psycopg2_connection(copies):
+    cursor = FakeCursor(copies)
+    return SimpleNamespace(dialect=SimpleNamespace(driver='psycopg2'), connection=SimpleNamespace(cursor=lambda: cursor))
+
+def test_write_frame_copies_with_psycopg2(tmp_path):
+    frame = cleaned_frame(tmp_path)
+    copies = []
+    load_csv_to_db.write_frame(psycopg2_connection(copies), frame)
+
+    assert len(copies) == 1
+    assert copies[0][0] == f"COPY crime_records ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)"
+
+def test_copy_frame_streams_batches(tmp_path):
+    frame = cleaned_frame(tmp_path)
+    copies = []
+    load_csv_to_db.copy_frame(psycopg2_connection(copies), frame, batch_size=2)
+
+    assert len(copies) == 2
+    copied = pd.read_csv(io.StringIO(''.join(data for _, data in copies)), header=None, names=list(frame.columns))
+    assert copied['crime_id'].fillna('').tolist() == ['a1', '', 'a3']
+    assert copied['location'].tolist()[2] == 'On or near Mill Lane, North'
+    assert copied['month'].tolist() == ['2024-01-01', '2024-01-01', '2024-02-01']
+
+def test_ensure_manifest_creates_crime_records_on_a_fresh_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/fresh.db")
+    frame = cleaned_frame(tmp_path)
+    with engine.begin() as conn:
+        load_csv_to_db.ensure_manifest(conn)
+        columns = {column['name'] for column in inspect(conn).get_columns('crime_records')}
+        assert set(frame.columns) <= columns
+        load_csv_to_db.write_frame(conn, frame)
+    with engine.connect() as conn:
+        assert pd.read_sql('SELECT COUNT(*) AS n FROM crime_records', conn)['n'][0] == 3
+
+def test_clean_data_of_unparsed_months_has_no_chained_assignment():
+    # Coordinates parse as floats but months stay strings, so clean_data converts them
+    chunk = pd.read_csv(io.StringIO(CSV.replace('-0.2,51.6', ',')))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', pd.errors.SettingWithCopyWarning)
+        cleaned = load_csv_to_db.clean_data(chunk)
+    assert cleaned['crime_id'].tolist() == ['a1', 'a3']
+    assert cleaned['month'].dt.month.tolist() == [1, 2]
@@ -0,0 +1,39 @@
+# test_sampling.py
+
+import numpy as np
+
+import sampling
+import spatial_index
+
+def test_stratum_caps_sum_to_budget():
+    sizes = np.array([5, 1000, 40, 300, 0, 12])
+    caps = sampling.stratum_caps(sizes, 200)
+    assert caps.sum() == 200
+    assert (caps <= sizes).all()
+    # Strata smaller than the cap are taken whole, the rest share one cap (give or take a row)
+    capped = caps < sizes
+    assert caps[capped].max() - caps[capped].min() <= 1
+    assert (caps[~capped] == sizes[~capped]).all()
+
+def test_stratum_caps_keep_everything_under_budget():
+    sizes = np.array([3, 4, 5])
+    assert sampling.stratum_caps(sizes, 100).tolist() == [3, 4, 5]
+
+def test_stratified_sample_is_deterministic_and_bounded():
+    rng = np.random.default_rng(1)
+    n = 5000
+    lat = rng.uniform(51.0, 52.0, n)
+    lon = rng.uniform(-1.0, 0.0, n)
+    crime_codes = rng.integers(0, 4, n)
+    bounds = spatial_index.Bounds(51.0, 52.0, -1.0, 0.0)
+    strata = sampling.viewport_strata(lat, lon, bounds, crime_codes, 4)
+    priorities = sampling.row_priorities(n)
+    rows = np.arange(n)
+
+    sample = sampling.stratified_sample(rows, strata, priorities, 500)
+    assert len(sample) == 500
+    assert (np.diff(sample) > 0).all()
+    assert np.array_equal(sample, sampling.stratified_sample(rows, strata, priorities, 500))
+
+def test_row_priorities_are_stable_when_rows_are_appended():
+    assert np.array_equal(sampling.row_priorities(100), sampling.row_priorities(150)[:100])
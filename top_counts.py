@@ -0,0 +1,99 @@
+# top_counts.py
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Columns whose most common values the statistics page ranks
+TOP_COUNT_COLUMNS = ['location', 'lsoa_name']
+
+# Exact crime counts of one column's values, per crime type. labels are in
+# descending order of their total count, so the overall top N are the first N
+# rows of counts (labels x crime_types).
+TopCounts = namedtuple('TopCounts', ['column', 'labels', 'crime_types', 'counts'])
+
+def count_rows(df):
+    """
+    Count a cleaned chunk's rows per (column, value, crime_type) for TOP_COUNT_COLUMNS.
+
+    Returns a Series of counts indexed by those three levels; rows without a
+    value are not counted.
+    """
+    counts = []
+    for column in TOP_COUNT_COLUMNS:
+        if column not in df.columns:
+            continue
+        grouped = df.groupby([column, 'crime_type'], observed=True).size()
+        grouped.index = pd.MultiIndex.from_arrays(
+            [np.full(len(grouped), column, dtype=object),
+             grouped.index.get_level_values(0).astype(str),
+             grouped.index.get_level_values(1).astype(str)],
+            names=['column_name', 'value', 'crime_type']
+        )
+        counts.append(grouped)
+    if not counts:
+        return pd.Series(dtype='int64', index=pd.MultiIndex.from_arrays([[], [], []], names=['column_name', 'value', 'crime_type']))
+    return pd.concat(counts)
+
+def merge_counts(total, counts):
+    """
+    Add the counts of one chunk to the running totals of a file.
+    """
+    if total is None:
+        return counts
+    return total.add(counts, fill_value=0).astype('int64')
+
+def build_top_counts(column, rows):
+    """
+    Build the TopCounts of a column from counter rows with value, crime_type and count columns.
+    """
+    values = rows['value'].astype('category')
+    crimes = rows['crime_type'].astype('category')
+    counts = np.zeros((len(values.cat.categories), len(crimes.cat.categories)), dtype=np.int64)
+    np.add.at(counts, (values.cat.codes.to_numpy(), crimes.cat.codes.to_numpy()), rows['count'].to_numpy())
+
+    # Stable sort keeps ties in label order
+    order = np.argsort(-counts.sum(axis=1), kind='stable')
+    return TopCounts(column, values.cat.categories[order].tolist(), crimes.cat.categories.tolist(), counts[order])
+
+def _crime_mask(top, selected_crimes):
+    """
+    Boolean mask of the selected crime types; None selects them all.
+    """
+    if selected_crimes is None:
+        return np.ones(len(top.crime_types), dtype=bool)
+    return np.isin(np.asarray(top.crime_types, dtype=object), list(selected_crimes))
+
+def _ranked_rows(top, n, selected_crimes):
+    """
+    Get the rows of the n most common labels and their counts over the selected crime types.
+    """
+    if selected_crimes is None:
+        rows = np.arange(min(n, len(top.labels)))
+        totals = top.counts[rows].sum(axis=1)
+    else:
+        totals = top.counts[:, _crime_mask(top, selected_crimes)].sum(axis=1)
+        rows = np.argsort(-totals, kind='stable')[:n]
+        totals = totals[rows]
+    return rows[totals > 0], totals[totals > 0]
+
+def get_top(top, n, selected_crimes=None):
+    """
+    Get the n most common values of the column, optionally counting only some crime types.
+    """
+    rows, totals = _ranked_rows(top, n, selected_crimes)
+    return pd.DataFrame({top.column: [top.labels[i] for i in rows], 'Count': totals})
+
+def get_top_by_crime_type(top, n, selected_crimes=None):
+    """
+    Break the n most common values of the column down by crime type.
+    """
+    rows, _ = _ranked_rows(top, n, selected_crimes)
+    crimes = np.flatnonzero(_crime_mask(top, selected_crimes))
+    breakdown = pd.DataFrame({
+        top.column: np.repeat(np.asarray(top.labels, dtype=object)[rows], len(crimes)),
+        'crime_type': np.tile(np.asarray(top.crime_types, dtype=object)[crimes], len(rows)),
+        'Count': top.counts[np.ix_(rows, crimes)].ravel(),
+    })
+    return breakdown[breakdown['Count'] > 0].reset_index(drop=True)